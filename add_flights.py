@@ -1,17 +1,43 @@
 # Python
+import argparse
 from inc.cache_manager import CacheManager
+from inc.fare_import import import_fares
 from inc.flights import UserInputFlightsConnector
 from travel_search import ConfigLoader
 from datetime import datetime, timedelta
 
 
+def bulk_import(cache_manager: CacheManager, flights_connector: UserInputFlightsConnector, paths, batch_size: int):
+    """Streams CSV/JSONL fare dumps into the cache, printing progress after every batch and a summary at the end."""
+    def progress(report):
+        print(f"{report['rows']} rows read, {report['written']} fares written "
+              f"({report['rows_per_second']:.0f} rows/s)", end="\r", flush=True)
+
+    report = import_fares(cache_manager, flights_connector, paths, batch_size, progress)
+    print()
+    for error in report["errors"]:
+        print(f"Skipped {error}")
+    print(f"Imported {report['written']} fares from {report['rows']} rows ({report['rejected']} rejected) in "
+          f"{report['seconds']:.1f}s, {report['rows_per_second']:.0f} rows/s.")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Add fares to the cache by hand, or in bulk from fare dumps.")
+    parser.add_argument("--import", dest="imports", nargs="+", metavar="PATH",
+                        help="CSV or JSONL fare dumps to import instead of prompting (fields: origin, destination, "
+                             "date, price, and optionally duration, airline, transportation_mode, payment_type)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Fares written per transaction when importing")
+    args = parser.parse_args()
+
     # Load configuration from config.yaml
     config = ConfigLoader.load_config()
 
     # Initialize CacheManager and FlightsConnector
     cache_manager = CacheManager(config)
     flights_connector = UserInputFlightsConnector(config)
+    if args.imports:
+        bulk_import(cache_manager, flights_connector, args.imports, args.batch_size)
+        return
     in_cal = False
     transportation_mode = "flight"
     payment_type = "money"
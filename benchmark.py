@@ -0,0 +1,127 @@
+# Python
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, Any, List
+
+from inc.synthetic_network import generate_network, generate_query
+
+
+def run_case(airports: int, days: int, destinations: int, constraint_density: float, seed: int,
+             route_density: float = 0.5, daily_density: float = 0.6, price_distribution: str = "lognormal",
+             search_options: Dict[str, Any] = None, measure_memory: bool = True) -> Dict[str, Any]:
+    """Generates one network and query, then measures a search on it. Returns the parameters and the metrics."""
+    graph = generate_network(airports=airports, days=days, route_density=route_density, daily_density=daily_density,
+                             price_distribution=price_distribution, seed=seed)
+    origin, stays, constraints = generate_query(graph, destinations=destinations,
+                                                constraint_density=constraint_density, seed=seed)
+    search_options = search_options or {}
+
+    def search():
+        return graph.find_least_cost_path(origin, stays, constraints, **search_options)
+
+    # Time and memory are measured on separate runs so tracemalloc's overhead does not skew the timing
+    start = time.perf_counter()
+    path, cost = search()
+    wall_time = time.perf_counter() - start
+    stats = graph.search_stats
+    peak_memory = None
+    if measure_memory:
+        tracemalloc.start()
+        search()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {"params": {"airports": airports, "days": days, "destinations": destinations,
+                       "constraint_density": constraint_density, "seed": seed, "route_density": route_density,
+                       "daily_density": daily_density, "price_distribution": price_distribution,
+                       "search_options": search_options},
+            "legs": len(graph.legs), "cost": None if path is None else cost, "wall_time": wall_time,
+            "peak_memory": peak_memory, "expanded": stats.expanded, "pushed": stats.pushed,
+            "max_heap": stats.max_heap, "pruned": stats.pruned, "phase_times": stats.phase_times, "gap": stats.gap}
+
+
+def case_id(result: Dict[str, Any]) -> str:
+    """Identifies the network and query; search options are left out so runs with different options line up."""
+    return json.dumps({name: value for name, value in result["params"].items() if name != "search_options"},
+                      sort_keys=True)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Returns one line per matching case with the ratios current / baseline."""
+    previous = {case_id(result): result for result in baseline["results"]}
+    lines = []
+    for result in current["results"]:
+        old = previous.get(case_id(result))
+        if old is None:
+            continue
+        params = result["params"]
+        ratios = []
+        for metric in ("wall_time", "peak_memory", "expanded", "max_heap"):
+            if old.get(metric) and result.get(metric) is not None:
+                ratios.append(f"{metric} x{result[metric] / old[metric]:.2f}")
+        same_cost = "" if old["cost"] == result["cost"] else f" COST CHANGED {old['cost']} -> {result['cost']}"
+        lines.append(f"dest={params['destinations']} days={params['days']} constraints={params['constraint_density']} "
+                     f"seed={params['seed']}: {', '.join(ratios)}{same_cost}")
+    return lines
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FlightGraph.find_least_cost_path on synthetic networks.")
+    parser.add_argument("--airports", type=int, default=12)
+    parser.add_argument("--route-density", type=float, default=0.5)
+    parser.add_argument("--daily-density", type=float, default=0.6)
+    parser.add_argument("--price-distribution", choices=["lognormal", "uniform"], default="lognormal")
+    parser.add_argument("--destinations", type=int, nargs="+", default=[3, 4, 5], help="Destination counts to sweep")
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 60], help="Calendar lengths to sweep")
+    parser.add_argument("--constraint-density", type=float, nargs="+", default=[0.0, 0.5],
+                        help="Blocked-range densities to sweep")
+    parser.add_argument("--seeds", type=int, default=2, help="Networks generated per combination")
+    parser.add_argument("--search-options", type=json.loads, default={},
+                        help="JSON object of extra find_least_cost_path keyword arguments")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Skip the traced peak-memory run, which is much slower than the timed run")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = []
+    for destinations, days, density, seed in itertools.product(args.destinations, args.days,
+                                                               args.constraint_density, range(args.seeds)):
+        result = run_case(args.airports, days, destinations, density, seed, route_density=args.route_density,
+                          daily_density=args.daily_density, price_distribution=args.price_distribution,
+                          search_options=args.search_options, measure_memory=not args.no_memory)
+        results.append(result)
+        memory = "" if result["peak_memory"] is None else f"{result['peak_memory'] / 1e6:.1f} MB peak, "
+        print(f"dest={destinations} days={days} constraints={density} seed={seed}: {result['wall_time']:.3f}s, "
+              f"{memory}{result['expanded']} expanded, {result['max_heap']} max heap, cost {result['cost']}")
+
+    report = {"meta": {"timestamp": datetime.now().isoformat(timespec="seconds"), "revision": git_revision(),
+                       "python": platform.python_version()}, "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.compare} ({baseline['meta']['revision']}):")
+        for line in compare(baseline, report):
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
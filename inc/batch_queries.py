@@ -0,0 +1,181 @@
+# Python
+import json
+import multiprocessing
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import yaml
+
+# Per-query search options a query file may set under "options", overriding the batch defaults
+SEARCH_OPTIONS = ("alternatives", "pareto", "deadline", "max_expansions", "seed", "routing", "best_start_only",
+                  "memo")
+
+# A query as read: (id, text, format), parsed only when it is run so one malformed query does not stop the batch
+QueryDocument = Tuple[str, str, str]
+
+# Per-process graph installed by _init_worker; unpickled once per worker, together with its warm bound tables
+_worker_graph = None
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _run_worker_query(document: QueryDocument, defaults: Dict[str, Any]) -> Dict[str, Any]:
+    return run_query(_worker_graph, document, defaults)
+
+
+def load_queries(paths: Iterable[str]) -> Iterator[QueryDocument]:
+    """
+    Reads query documents lazily: a .jsonl file (or "-" for standard input) holds one JSON query per line, any other
+    file is a single YAML query like query/default.yaml. Blank lines are skipped.
+    """
+    for path in paths:
+        if path == "-" or path.endswith(".jsonl"):
+            stream = sys.stdin if path == "-" else open(path, "r")
+            try:
+                for number, line in enumerate(stream, 1):
+                    if line.strip():
+                        yield f"{path}:{number}", line, "json"
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+        else:
+            with open(path, "r") as f:
+                yield path, f.read(), "yaml"
+
+
+def parse_query(raw: Any) -> Tuple[str, Dict[str, Tuple[int, int]], Dict[str, List[Tuple[str, str]]], Dict[str, Any]]:
+    """
+    Validates one decoded query and converts it to find_least_cost_path's argument types.
+    Returns (origin, destinations, constraints, options); raises ValueError describing the first problem found.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("A query must be a mapping.")
+    if not raw.get("origin") or not isinstance(raw.get("destinations"), dict) or not raw["destinations"]:
+        raise ValueError("A query needs an origin and at least one destination.")
+    origin = str(raw["origin"]).strip().upper()
+    destinations = {}
+    for destination, days in raw["destinations"].items():
+        try:
+            min_days, max_days = (int(day) for day in days)
+        except (TypeError, ValueError):
+            raise ValueError(f"Days for {destination} must be a [minimum, maximum] pair of integers.")
+        if min_days > max_days:
+            raise ValueError(f"Minimum days for {destination} cannot be greater than maximum days.")
+        destinations[str(destination).strip().upper()] = (min_days, max_days)
+    constraints = {}
+    for destination, ranges in (raw.get("constraints") or {}).items():
+        # YAML reads unquoted dates as date objects; str() gives them back in YYYY-MM-DD form
+        constraints[str(destination).strip().upper()] = [(str(start), str(end)) for start, end in ranges]
+    options = raw.get("options") or {}
+    unknown = set(options) - set(SEARCH_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown search options: {', '.join(sorted(unknown))}.")
+    return origin, destinations, constraints, options
+
+
+def parse_date_range(raw: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Reads a query's optional date_range ({start, end}, the inclusive range of first departure dates to compare).
+    Returns (start, end), or None if the query has no date_range; raises ValueError if it is malformed.
+    """
+    date_range = raw.get("date_range")
+    if date_range is None:
+        return None
+    if not isinstance(date_range, dict) or not date_range.get("start") or not date_range.get("end"):
+        raise ValueError("date_range needs a start and an end date.")
+    start, end = str(date_range["start"]), str(date_range["end"])
+    if start > end:
+        raise ValueError("The date_range start cannot be after its end.")
+    return start, end
+
+
+def _path_json(path: List[Tuple[str, str, float]]) -> List[Dict[str, Any]]:
+    return [{"location": location, "date": date, "cost": cost} for location, date, cost in path]
+
+
+def run_query(graph, document: QueryDocument, defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs one query document against graph and returns its JSON-ready result: the query id, the cheapest "path" and
+    "cost" (both None if no itinerary exists) or, with the alternatives/pareto options, a list of "itineraries", or,
+    with a date_range, the cheapest itinerary "by_start_date" (only the cheapest date with best_start_only), plus the
+    main search statistics. A query that cannot be parsed or searched gets an "error" message instead.
+    :param defaults: Search options for queries that do not set their own.
+    """
+    query_id, text, kind = document
+    start = time.perf_counter()
+    try:
+        raw = json.loads(text) if kind == "json" else yaml.safe_load(text)
+        if isinstance(raw, dict) and raw.get("id") is not None:
+            query_id = str(raw["id"])
+        origin, destinations, constraints, options = parse_query(raw)
+        date_range = parse_date_range(raw)
+        options = {**defaults, **options}
+        result = {"id": query_id, "origin": origin, "destinations": list(destinations)}
+        if date_range is not None:
+            by_start_date = graph.find_by_start_date(origin, destinations, constraints, *date_range,
+                                                     best_only=bool(options.get("best_start_only")))
+            result["by_start_date"] = {date: {"cost": cost if path is not None else None,
+                                              "path": _path_json(path) if path is not None else None}
+                                       for date, (path, cost) in by_start_date.items()}
+        elif options.get("pareto") or options.get("alternatives", 1) > 1:
+            itineraries = graph.find_itineraries(origin, destinations, constraints, k=options.get("alternatives", 1),
+                                                 objective="pareto" if options.get("pareto") else "price")
+            result["itineraries"] = [{"cost": cost, "minutes": minutes, "path": _path_json(path)}
+                                     for path, cost, minutes in itineraries]
+        else:
+            path, cost = graph.find_least_cost_path(origin, destinations, constraints,
+                                                    seed=options.get("seed", True), deadline=options.get("deadline"),
+                                                    max_expansions=options.get("max_expansions"),
+                                                    routing=options.get("routing", "legs"),
+                                                    memo=options.get("memo", True))
+            result["cost"] = cost if path is not None else None
+            result["path"] = _path_json(path) if path is not None else None
+    except (ValueError, TypeError, json.JSONDecodeError, yaml.YAMLError) as e:
+        return {"id": query_id, "error": str(e)}
+    stats = graph.search_stats
+    result["stats"] = {"expanded": stats.expanded, "pushed": stats.pushed, "gap": stats.gap,
+                       "stopped_early": stats.stopped_early, "memo_hits": stats.memo_hits,
+                       "wall_time": time.perf_counter() - start}
+    return result
+
+
+def run_batch(graph, documents: Iterable[QueryDocument], defaults: Dict[str, Any] = None,
+              workers: int = 1) -> Iterator[Dict[str, Any]]:
+    """
+    Runs many queries against one loaded graph and yields their results in query order as they finish. The graph's
+    leg indexes and fare-bound tables are built once and shared by every query rather than rebuilt per trip, and a
+    query repeated in the batch is answered from the graph's search memo unless it sets the memo option to false.
+    :param defaults: Search options for queries that do not set their own (see SEARCH_OPTIONS).
+    :param workers: Process count; above 1 the bound tables (and the connection index, for connection routing) are
+    filled first so each worker starts from the same warm copy of the graph. At most two queries per worker are
+    submitted ahead of the result being waited on, so documents are read as the batch goes rather than all up front.
+    As with parallel search, scripts need an if __name__ == "__main__" guard.
+    """
+    defaults = defaults or {}
+    if workers <= 1:
+        for document in documents:
+            yield run_query(graph, document, defaults)
+        return
+
+    for weight in ("price", "duration"):
+        bounds = graph.fare_bounds(weight)
+        for airport in range(len(graph.legs.airports)):
+            bounds.fares_from(airport)
+    if defaults.get("routing") == "connections":
+        graph.connection_index()
+    context = multiprocessing.get_context("forkserver")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(graph,)) as executor:
+        pending = deque()
+        for document in documents:
+            pending.append(executor.submit(_run_worker_query, document, defaults))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
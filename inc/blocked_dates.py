@@ -0,0 +1,54 @@
+# Python
+from typing import Dict, List, Optional, Tuple
+
+from .leg_store import date_to_ordinal
+
+
+class BlockedDates:
+    """
+    Date constraints compiled into one day-ordinal bitset per airport.
+    Bit i of an airport's bitset is set when day (base + i) falls in one of its blocked (start, end) ranges.
+    """
+
+    def __init__(self, constraints: Dict[str, List[Tuple[str, str]]], airport_ids: Dict[str, int]):
+        self.blocked = {}  # Airport id -> (base ordinal, bitset)
+        for code, ranges in constraints.items():
+            airport_id = airport_ids.get(code)
+            if airport_id is None or not ranges:
+                continue
+            spans = [(date_to_ordinal(start), date_to_ordinal(end)) for start, end in ranges]
+            base = min(start for start, _ in spans)
+            bits = 0
+            for start, end in spans:
+                if start <= end:
+                    bits |= ((1 << (end - start + 1)) - 1) << (start - base)
+            if bits:
+                self.blocked[airport_id] = (base, bits)
+
+    def __contains__(self, airport: int) -> bool:
+        return airport in self.blocked
+
+    def is_blocked(self, airport: int, day: int) -> bool:
+        """Returns True if travel to or from the airport is not allowed on the given day."""
+        entry = self.blocked.get(airport)
+        if entry is None:
+            return False
+        base, bits = entry
+        return day >= base and bits >> (day - base) & 1 == 1
+
+    def next_blocked(self, airport: int, day: int) -> Optional[int]:
+        """Returns the first blocked day on or after the given day, or None if there is none."""
+        entry = self.blocked.get(airport)
+        if entry is None:
+            return None
+        base, bits = entry
+        first = max(day, base)
+        rest = bits >> (first - base)
+        if not rest:
+            return None
+        return first + (rest & -rest).bit_length() - 1
+
+    def any_blocked(self, airport: int, first: int, last: int) -> bool:
+        """Returns True if any day from first to last, inclusive, is blocked at the airport."""
+        next_blocked = self.next_blocked(airport, first)
+        return next_blocked is not None and next_blocked <= last
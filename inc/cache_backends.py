@@ -0,0 +1,269 @@
+# Python
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+# A stored entry: (key, timestamp, result)
+CacheEntry = Tuple[str, float, Dict[str, Any]]
+
+
+def entry_matches(result: Dict[str, Any], origin: Optional[str], destination: Optional[str],
+                  start_date: Optional[str], end_date: Optional[str]) -> bool:
+    """Returns True if a cached fare falls on the given route and within the inclusive YYYY-MM-DD date range."""
+    if origin is not None and result.get("origin") != origin:
+        return False
+    if destination is not None and result.get("destination") != destination:
+        return False
+    if start_date is not None or end_date is not None:
+        date = result.get("date")
+        if date is None or (start_date is not None and date < start_date) or (end_date is not None and date > end_date):
+            return False
+    return True
+
+
+class CacheBackend(ABC):
+    """Abstract base class for cache storage backends."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """Returns (timestamp, result) for a key, or None if it is not stored."""
+        pass
+
+    @abstractmethod
+    def set(self, key: str, result: Dict[str, Any], timestamp: float):
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    def scan(self, origin: str = None, destination: str = None, start_date: str = None,
+             end_date: str = None) -> Iterator[CacheEntry]:
+        """Yields every stored entry, optionally restricted to one route and an inclusive date range."""
+        pass
+
+    @abstractmethod
+    def expired(self, cutoff: float) -> Iterator[str]:
+        """Yields the keys of entries written before the cutoff timestamp."""
+        pass
+
+    def set_many(self, entries: Iterable[CacheEntry]):
+        """Stores many entries; backends that support transactions write them in one."""
+        for key, timestamp, result in entries:
+            self.set(key, result, timestamp)
+
+    def delete_many(self, keys: Iterable[str]):
+        for key in keys:
+            self.delete(key)
+
+    def changes_since(self, marker: Any, known_keys: Iterable[str]) -> Tuple[List[CacheEntry], List[str], Any]:
+        """
+        Returns (entries written since marker, keys deleted since marker, new marker). A marker of None means from the
+        beginning. known_keys are the keys the caller already holds, used by backends that do not log deletions.
+        This fallback rescans everything and never returns a marker.
+        """
+        entries = list(self.scan())
+        present = {key for key, _, _ in entries}
+        return entries, [key for key in known_keys if key not in present], None
+
+    def close(self):
+        pass
+
+
+class JsonDirectoryBackend(CacheBackend):
+    """The original layout: one {"timestamp", "result"} JSON file per key in a flat directory."""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        cache_file = self._path(key)
+        if os.path.exists(cache_file):
+            with open(cache_file, "r") as f:
+                data = json.load(f)
+                return data["timestamp"], data["result"]
+        return None
+
+    def set(self, key: str, result: Dict[str, Any], timestamp: float):
+        with open(self._path(key), "w") as f:
+            json.dump({"timestamp": timestamp, "result": result}, f)
+
+    def delete(self, key: str):
+        if os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+    def _entries(self) -> Iterator[CacheEntry]:
+        for cache_file in os.listdir(self.cache_dir):
+            if cache_file.endswith(".json"):
+                with open(os.path.join(self.cache_dir, cache_file), "r") as f:
+                    data = json.load(f)
+                yield cache_file[:-len(".json")], data["timestamp"], data["result"]
+
+    def scan(self, origin: str = None, destination: str = None, start_date: str = None,
+             end_date: str = None) -> Iterator[CacheEntry]:
+        for key, timestamp, result in self._entries():
+            if entry_matches(result, origin, destination, start_date, end_date):
+                yield key, timestamp, result
+
+    def expired(self, cutoff: float) -> Iterator[str]:
+        for key, timestamp, _ in self._entries():
+            if timestamp < cutoff:
+                yield key
+
+    def changes_since(self, marker: Any, known_keys: Iterable[str]) -> Tuple[List[CacheEntry], List[str], Any]:
+        """Uses file modification times as the marker, so only files written since are opened."""
+        entries, present = [], set()
+        latest = marker or 0
+        with os.scandir(self.cache_dir) as files:
+            for cache_file in files:
+                if not cache_file.name.endswith(".json"):
+                    continue
+                key = cache_file.name[:-len(".json")]
+                present.add(key)
+                modified = cache_file.stat().st_mtime_ns
+                latest = max(latest, modified)
+                # Files sharing the marker's mtime are re-read, since a write may have landed in the same tick;
+                # FlightGraph.sync_cache skips the ones whose leg it already holds
+                if marker is None or modified >= marker:
+                    with open(cache_file.path, "r") as f:
+                        data = json.load(f)
+                    entries.append((key, data["timestamp"], data["result"]))
+        return entries, [key for key in known_keys if key not in present], latest
+
+
+class SqliteBackend(CacheBackend):
+    """
+    All entries in one SQLite file. Route and date are copied out of each result into indexed columns, so loading the
+    graph or a fare calendar is a single range scan instead of one open() per entry.
+    Every write and delete takes the next value of a global sequence, and deletions leave a tombstone, so readers can
+    ask for just the changes after a sequence number.
+    """
+    SCAN_BATCH = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, timestamp REAL NOT NULL, "
+                                    "origin TEXT, destination TEXT, date TEXT, result TEXT NOT NULL, "
+                                    "seq INTEGER NOT NULL DEFAULT 0)")
+            columns = {row[1] for row in self.connection.execute("PRAGMA table_info(cache)")}
+            if "seq" not in columns:
+                self.connection.execute("ALTER TABLE cache ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS cache_route ON cache (origin, destination, date)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS cache_timestamp ON cache (timestamp)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS cache_seq ON cache (seq)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS tombstones (key TEXT PRIMARY KEY, "
+                                    "seq INTEGER NOT NULL)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS sequence (seq INTEGER NOT NULL)")
+            self.connection.execute("INSERT INTO sequence SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM sequence)")
+
+    @staticmethod
+    def _row(key: str, timestamp: float, result: Dict[str, Any], seq: int) -> Tuple:
+        return (key, timestamp, result.get("origin"), result.get("destination"), result.get("date"),
+                json.dumps(result), seq)
+
+    def _reserve(self, count: int) -> int:
+        """Reserves count sequence numbers inside the open transaction and returns the first."""
+        self.connection.execute("UPDATE sequence SET seq = seq + ?", (count,))
+        return self.connection.execute("SELECT seq FROM sequence").fetchone()[0] - count + 1
+
+    def get(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        with self.lock:
+            row = self.connection.execute("SELECT timestamp, result FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(self, key: str, result: Dict[str, Any], timestamp: float):
+        self.set_many([(key, timestamp, result)])
+
+    def set_many(self, entries: Iterable[CacheEntry]):
+        entries = list(entries)
+        if not entries:
+            return
+        with self.lock, self.connection:
+            first = self._reserve(len(entries))
+            rows = [self._row(key, timestamp, result, first + i) for i, (key, timestamp, result) in enumerate(entries)]
+            self.connection.executemany("INSERT OR REPLACE INTO cache (key, timestamp, origin, destination, date, "
+                                        "result, seq) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.connection.executemany("DELETE FROM tombstones WHERE key = ?", [(row[0],) for row in rows])
+
+    def delete(self, key: str):
+        self.delete_many([key])
+
+    def delete_many(self, keys: Iterable[str]):
+        keys = list(keys)
+        if not keys:
+            return
+        with self.lock, self.connection:
+            first = self._reserve(len(keys))
+            self.connection.executemany("DELETE FROM cache WHERE key = ?", [(key,) for key in keys])
+            self.connection.executemany("INSERT OR REPLACE INTO tombstones (key, seq) VALUES (?, ?)",
+                                        [(key, first + i) for i, key in enumerate(keys)])
+
+    def _query(self, sql: str, params: Tuple) -> Iterator[Tuple]:
+        """Runs a query and yields its rows in batches, holding the lock only while fetching."""
+        with self.lock:
+            cursor = self.connection.execute(sql, params)
+            rows = cursor.fetchmany(self.SCAN_BATCH)
+        while rows:
+            yield from rows
+            with self.lock:
+                rows = cursor.fetchmany(self.SCAN_BATCH)
+
+    def scan(self, origin: str = None, destination: str = None, start_date: str = None,
+             end_date: str = None) -> Iterator[CacheEntry]:
+        clauses, params = [], []
+        for column, operator, value in (("origin", "=", origin), ("destination", "=", destination),
+                                        ("date", ">=", start_date), ("date", "<=", end_date)):
+            if value is not None:
+                clauses.append(f"{column} {operator} ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        for key, timestamp, result in self._query(f"SELECT key, timestamp, result FROM cache{where}", tuple(params)):
+            yield key, timestamp, json.loads(result)
+
+    def expired(self, cutoff: float) -> Iterator[str]:
+        for (key,) in self._query("SELECT key FROM cache WHERE timestamp < ?", (cutoff,)):
+            yield key
+
+    def changes_since(self, marker: Any, known_keys: Iterable[str]) -> Tuple[List[CacheEntry], List[str], Any]:
+        """Uses the sequence number as the marker, so only rows and tombstones written after it are read."""
+        with self.lock:
+            latest = self.connection.execute("SELECT seq FROM sequence").fetchone()[0]
+        if marker is None or marker > latest:  # No marker, or one from a database that has since been replaced
+            entries = list(self.scan())
+            present = {key for key, _, _ in entries}
+            return entries, [key for key in known_keys if key not in present], latest
+        entries = [(key, timestamp, json.loads(result)) for key, timestamp, result in
+                   self._query("SELECT key, timestamp, result FROM cache WHERE seq > ?", (marker,))]
+        deleted = [key for (key,) in self._query("SELECT key FROM tombstones WHERE seq > ?", (marker,))]
+        return entries, deleted, latest
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def create_backend(config: Dict[str, Any]) -> CacheBackend:
+    """Builds the backend named by config["cache_backend"] ("json" by default, or "sqlite")."""
+    backend = config.get("cache_backend", "json")
+    if backend == "json":
+        return JsonDirectoryBackend(config["cache_dir"])
+    if backend == "sqlite":
+        return SqliteBackend(config.get("cache_db", os.path.join(config["cache_dir"], "cache.sqlite3")))
+    raise ValueError(f"Unknown cache backend '{backend}'.")
@@ -1,37 +1,118 @@
 # Python
 import json
-import os
+import threading
 import time
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Iterator, Tuple
+
+from .cache_backends import CacheEntry, create_backend
 
 
 class CacheManager:
+    """Fare cache with a bounded in-memory LRU tier in front of the configured storage backend."""
 
     def __init__(self, config: Dict[str, Any]):
         self.cache_dir = config["cache_dir"]
         self.cache_timeout = config["cache_timeout"]
-        if not os.path.exists(self.cache_dir):
-            os.makedirs(self.cache_dir)
+        self.backend = create_backend(config)
+        self.memory_limit = config.get("cache_memory_entries", 1024)
+        self.memory = OrderedDict()  # Key -> (timestamp, result), least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._compaction_stop = None
+        if config.get("cache_compaction_interval", 0) > 0:
+            self.start_compaction(config["cache_compaction_interval"])
+
+    def _remember(self, key: str, timestamp: float, result: Dict[str, Any]):
+        if self.memory_limit <= 0:
+            return
+        with self.lock:
+            self.memory[key] = (timestamp, result)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_limit:
+                self.memory.popitem(last=False)
 
     def get_cache(self, key: str) -> Dict[str, Any]:
-        cache_file = os.path.join(self.cache_dir, f"{key}.json")
-        if os.path.exists(cache_file):
-            with open(cache_file, "r") as f:
-                data = json.load(f)
-                if time.time() - data["timestamp"] < self.cache_timeout:
-                    return data["result"]
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if now - entry[0] < self.cache_timeout:
+                    self.memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self.memory[key]
+            self.misses += 1
+
+        entry = self.backend.get(key)
+        if entry is not None:
+            timestamp, result = entry
+            if now - timestamp < self.cache_timeout:
+                self._remember(key, timestamp, result)
+                return result
         return None
 
     def set_cache(self, key: str, result: Dict[str, Any]):
-        cache_file = os.path.join(self.cache_dir, f"{key}.json")
-        with open(cache_file, "w") as f:
-            json.dump({"timestamp": time.time(), "result": result}, f)
+        timestamp = time.time()
+        self.backend.set(key, result, timestamp)
+        self._remember(key, timestamp, result)
+
+    def set_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]):
+        """
+        Stores many (key, result) pairs with one timestamp, in a single transaction on backends that support it.
+        Bulk writes bypass the memory tier so a large import does not evict the entries searches are using; stale
+        copies of the written keys are dropped from it instead.
+        """
+        timestamp = time.time()
+        entries = [(key, timestamp, result) for key, result in items]
+        self.backend.set_many(entries)
+        with self.lock:
+            for key, _, _ in entries:
+                self.memory.pop(key, None)
+
+    def scan(self, origin: str = None, destination: str = None, start_date: str = None,
+             end_date: str = None) -> Iterator[CacheEntry]:
+        """Yields (key, timestamp, result) for stored entries, optionally limited to a route and date range."""
+        return self.backend.scan(origin, destination, start_date, end_date)
+
+    def expired_keys(self) -> Iterator[str]:
+        """Yields the keys of entries older than cache_timeout."""
+        return self.backend.expired(time.time() - self.cache_timeout)
+
+    def compact(self) -> int:
+        """Deletes every entry older than cache_timeout from memory and storage. Returns the number removed."""
+        expired = list(self.expired_keys())
+        self.backend.delete_many(expired)
+        with self.lock:
+            for key in expired:
+                self.memory.pop(key, None)
+        return len(expired)
+
+    def start_compaction(self, interval: float):
+        """Runs compact() every interval seconds on a daemon thread until stop_compaction() is called."""
+        self.stop_compaction()
+        stop = self._compaction_stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.compact()
+
+        threading.Thread(target=run, name="cache-compaction", daemon=True).start()
+
+    def stop_compaction(self):
+        if self._compaction_stop is not None:
+            self._compaction_stop.set()
+            self._compaction_stop = None
+
+    def stats(self) -> Dict[str, int]:
+        """Returns LRU hit/miss counters and the current number of entries held in memory."""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self.memory),
+                    "memory_limit": self.memory_limit}
 
     def output_cache(self):
-        """Outputs the full cache for debugging."""
+        """Outputs the full cache for debugging. This reads every stored entry, so only call it on request."""
         print("Cache contents:")
-        for cache_file in os.listdir(self.cache_dir):
-            if cache_file.endswith(".json"):
-                with open(os.path.join(self.cache_dir, cache_file), "r") as f:
-                    cached_data = json.load(f)
-                    print(json.dumps(cached_data, indent=4))
+        for _, timestamp, result in self.backend.scan():
+            print(json.dumps({"timestamp": timestamp, "result": result}, indent=4))
@@ -0,0 +1,191 @@
+# Python
+from typing import Dict, List, Tuple
+
+from .leg_store import LegStore, RouteLegs
+
+# One way through a hub for a (departure, arrival) date pair: (total price, hub id, first leg price, second leg price,
+# total flight minutes)
+Connection = Tuple[float, int, float, float, int]
+
+
+class ConnectionLegs:
+    """
+    The one-stop connections between one (origin, destination) pair, stored column-wise and sorted by departure date
+    like RouteLegs so the search can walk them with the same window lookups. Rows for the same departure and arrival
+    dates go through different hubs, cheapest first.
+    """
+    __slots__ = ("dates", "arrivals", "prices", "first_prices", "second_prices", "durations", "hubs", "_cheapest")
+
+    def __init__(self, slots: Dict[Tuple[int, int], List[Connection]]):
+        self.dates = []  # Departure ordinals, ascending
+        self.arrivals = []  # Arrival ordinals: the departure date, or a later one after an overnight layover
+        self.prices = []  # Total of both legs
+        self.first_prices = []
+        self.second_prices = []
+        self.durations = []  # Minutes in the air
+        self.hubs = []  # Airport id connected through
+        self._cheapest = None
+        for (departure, arrival), options in sorted(slots.items()):
+            for price, hub, first_price, second_price, minutes in options:
+                self.dates.append(departure)
+                self.arrivals.append(arrival)
+                self.prices.append(price)
+                self.first_prices.append(first_price)
+                self.second_prices.append(second_price)
+                self.durations.append(minutes)
+                self.hubs.append(hub)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    window = RouteLegs.window
+    cheapest = RouteLegs.cheapest
+
+
+class ConnectionIndex:
+    """
+    Cheapest one-stop connections between every pair of airports, for searches that move only between the trip's
+    stops. Built once from a LegStore and then updated leg by leg as legs are added or removed.
+    A connection must leave the hub on the day it arrives there or, with an overnight layover, up to
+    max_layover_days later. Legs only carry a date, so a same-day connection is allowed when both flights plus
+    min_connection_minutes fit within one day.
+    :param per_slot: Hubs kept per (origin, destination, departure, arrival) slot, so one closed by a query's blocked
+        dates still leaves alternatives.
+    """
+
+    def __init__(self, legs: LegStore, min_connection_minutes: int = 60, max_layover_days: int = 1,
+                 per_slot: int = 3):
+        self.legs = legs
+        self.min_connection_minutes = min_connection_minutes
+        self.max_layover_days = max_layover_days
+        self.per_slot = per_slot
+        self.slots = {}  # (origin id, destination id) -> {(departure, arrival): [Connection, cheapest first]}
+        self.sources = {}  # Airport id -> ids of the airports with legs into it
+        self._compiled = {}  # (origin id, destination id) -> ConnectionLegs, dropped when the pair's slots change
+        for origin_id, by_destination in legs.routes.items():
+            for destination_id in by_destination:
+                self.sources.setdefault(destination_id, set()).add(origin_id)
+        for hub in list(self.sources):
+            for origin_id in self.sources[hub]:
+                for destination_id in legs.routes_from(hub):
+                    self._connect(origin_id, hub, destination_id)
+
+    def _allowed(self, departure: int, first_minutes: int, onward: int, second_minutes: int) -> bool:
+        if onward > departure:
+            return True
+        return first_minutes + self.min_connection_minutes + second_minutes <= 24 * 60
+
+    def _pair(self, first: RouteLegs, second: RouteLegs, first_index: int,
+              onward_dates: Tuple[int, int] = None) -> Dict[Tuple[int, int], Connection]:
+        """Cheapest allowed continuation of one first leg over the second route, per arrival date."""
+        departure = first.dates[first_index]
+        earliest, latest = onward_dates or (departure, departure + self.max_layover_days)
+        start, stop = second.window(earliest, latest)
+        best = {}
+        for j in range(start, stop):
+            onward = second.dates[j]
+            if not self._allowed(departure, first.durations[first_index], onward, second.durations[j]):
+                continue
+            price = first.prices[first_index] + second.prices[j]
+            if price < best.get((departure, onward), (float("inf"),))[0]:
+                best[(departure, onward)] = (price, first.prices[first_index], second.prices[j],
+                                             first.durations[first_index] + second.durations[j])
+        return best
+
+    def _offer(self, origin_id: int, destination_id: int, slot: Tuple[int, int], hub: int, price: float,
+               first_price: float, second_price: float, minutes: int):
+        """Adds a connection to its slot if it is among the per_slot cheapest hubs there."""
+        options = self.slots.setdefault((origin_id, destination_id), {}).setdefault(slot, [])
+        for index, option in enumerate(options):
+            if option[1] == hub:
+                if option[0] <= price:
+                    return
+                del options[index]
+                break
+        if len(options) >= self.per_slot and options[-1][0] <= price:
+            return
+        options.append((price, hub, first_price, second_price, minutes))
+        options.sort(key=lambda option: option[0])
+        del options[self.per_slot:]
+        self._compiled.pop((origin_id, destination_id), None)
+
+    def _connect(self, origin_id: int, hub: int, destination_id: int):
+        """Offers every connection from origin_id to destination_id through hub."""
+        if origin_id == destination_id or hub in (origin_id, destination_id):
+            return
+        first, second = self.legs.route(origin_id, hub), self.legs.route(hub, destination_id)
+        if first is None or second is None:
+            return
+        best = {}
+        for i in range(len(first)):
+            for slot, connection in self._pair(first, second, i).items():
+                if connection[0] < best.get(slot, (float("inf"),))[0]:
+                    best[slot] = connection
+        for slot, (price, first_price, second_price, minutes) in best.items():
+            self._offer(origin_id, destination_id, slot, hub, price, first_price, second_price, minutes)
+
+    def _rebuild_slot(self, origin_id: int, destination_id: int, slot: Tuple[int, int]):
+        """Recomputes one slot from scratch over every hub, after a leg it may have used was removed."""
+        by_slot = self.slots.get((origin_id, destination_id))
+        if by_slot is None or slot not in by_slot:
+            return
+        del by_slot[slot]
+        self._compiled.pop((origin_id, destination_id), None)
+        departure, arrival = slot
+        for hub, first in self.legs.routes_from(origin_id).items():
+            second = self.legs.route(hub, destination_id)
+            if second is None or hub == destination_id:
+                continue
+            for i in range(*first.window(departure, departure)):
+                connection = self._pair(first, second, i, (arrival, arrival)).get(slot)
+                if connection is not None:
+                    self._offer(origin_id, destination_id, slot, hub, *connection)
+
+    def add_leg(self, origin_id: int, destination_id: int, date_ordinal: int):
+        """Offers the connections a leg just added to the store creates, as either the first or the second leg."""
+        self.sources.setdefault(destination_id, set()).add(origin_id)
+        # As the first leg, through destination_id
+        first = self.legs.route(origin_id, destination_id)
+        indexes = range(*first.window(date_ordinal, date_ordinal))
+        for onward_id, second in self.legs.routes_from(destination_id).items():
+            if onward_id == origin_id:
+                continue
+            for i in indexes:
+                for slot, connection in self._pair(first, second, i).items():
+                    self._offer(origin_id, onward_id, slot, destination_id, *connection)
+        # As the second leg, through origin_id
+        for source_id in self.sources.get(origin_id, ()):
+            earlier = self.legs.route(source_id, origin_id)
+            if earlier is None or source_id == destination_id:
+                continue
+            for i in range(*earlier.window(date_ordinal - self.max_layover_days, date_ordinal)):
+                for slot, connection in self._pair(earlier, first, i, (date_ordinal, date_ordinal)).items():
+                    self._offer(source_id, destination_id, slot, origin_id, *connection)
+
+    def remove_leg(self, origin_id: int, destination_id: int, date_ordinal: int):
+        """Recomputes the slots a leg just removed from the store may have been part of."""
+        layovers = range(self.max_layover_days + 1)
+        # As the first leg, through destination_id
+        for onward_id in self.legs.routes_from(destination_id):
+            self._rebuild_through(origin_id, onward_id, destination_id,
+                                  [(date_ordinal, date_ordinal + days) for days in layovers])
+        # As the second leg, through origin_id
+        for source_id in self.sources.get(origin_id, ()):
+            self._rebuild_through(source_id, destination_id, origin_id,
+                                  [(date_ordinal - days, date_ordinal) for days in layovers])
+
+    def _rebuild_through(self, origin_id: int, destination_id: int, hub: int, slots: List[Tuple[int, int]]):
+        by_slot = self.slots.get((origin_id, destination_id), {})
+        for slot in slots:
+            if any(option[1] == hub for option in by_slot.get(slot, ())):
+                self._rebuild_slot(origin_id, destination_id, slot)
+
+    def route(self, origin_id: int, destination_id: int) -> ConnectionLegs:
+        """Returns the connections between two airports, or None if there are none."""
+        compiled = self._compiled.get((origin_id, destination_id))
+        if compiled is None:
+            by_slot = self.slots.get((origin_id, destination_id))
+            if not by_slot:
+                return None
+            compiled = self._compiled[(origin_id, destination_id)] = ConnectionLegs(by_slot)
+        return compiled
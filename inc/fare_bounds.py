@@ -0,0 +1,91 @@
+# Python
+import heapq
+import time
+from typing import Dict, List
+
+from .leg_store import LegStore
+
+
+class FareBounds:
+    """
+    Admissible lower bounds on the cost of finishing a trip, derived from the cheapest fare between airports.
+
+    The min-fare matrix is the shortest-path closure of each route's cheapest leg, so connecting through airports
+    that are not destinations is already accounted for. It ignores dates, which only makes the bound looser.
+    With weight="duration" the same tables bound total flight minutes instead, using each route's shortest leg.
+    """
+
+    def __init__(self, legs: LegStore, weight: str = "price"):
+        if weight not in ("price", "duration"):
+            raise ValueError(f"Unknown weight '{weight}'.")
+        self.legs = legs
+        self.weight = weight
+        self.min_fares = {}  # Source id -> {target id: cheapest total fare}, filled lazily one row at a time
+        self.tree_costs = {}  # Remaining mask -> minimum spanning tree weight over those destinations
+        self.memo = {}  # (origin id, city id, remaining mask) -> lower bound
+        self.compute_time = 0.0  # Seconds spent filling memo misses, reported in search statistics
+
+    def fares_from(self, source: int) -> Dict[int, float]:
+        """Returns the cheapest fare from source to every reachable airport (Dijkstra over route minimums)."""
+        row = self.min_fares.get(source)
+        if row is not None:
+            return row
+        row = {source: 0.0}
+        pq = [(0.0, source)]
+        while pq:
+            fare, airport = heapq.heappop(pq)
+            if fare > row[airport]:
+                continue
+            for next_id, route in self.legs.routes_from(airport).items():
+                next_fare = fare + (route.min_price if self.weight == "price" else min(route.durations))
+                if next_fare < row.get(next_id, float("inf")):
+                    row[next_id] = next_fare
+                    heapq.heappush(pq, (next_fare, next_id))
+        self.min_fares[source] = row
+        return row
+
+    def fare(self, source: int, target: int) -> float:
+        return self.fares_from(source).get(target, float("inf"))
+
+    def tree_cost(self, remaining: List[int], mask: int) -> float:
+        """Weight of a minimum spanning tree over the remaining destinations, using the cheaper direction per pair."""
+        cost = self.tree_costs.get(mask)
+        if cost is not None:
+            return cost
+        cost = 0.0
+        if remaining:
+            # Prim's algorithm on the dense complete graph
+            closest = {airport: float("inf") for airport in remaining[1:]}
+            latest = remaining[0]
+            while closest:
+                for airport in closest:
+                    weight = min(self.fare(latest, airport), self.fare(airport, latest))
+                    if weight < closest[airport]:
+                        closest[airport] = weight
+                latest = min(closest, key=closest.get)
+                cost += closest.pop(latest)
+        self.tree_costs[mask] = cost
+        return cost
+
+    def lower_bound(self, origin: int, current: int, mask: int) -> float:
+        """
+        Lower bound on the cost of visiting every destination in mask from current and then returning to origin.
+        Any such route leaves current for some destination, spans the destinations and flies home from one of them,
+        so it costs at least the cheapest way in, plus their spanning tree, plus the cheapest way out.
+        """
+        key = (origin, current, mask)
+        bound = self.memo.get(key)
+        if bound is not None:
+            return bound
+        start = time.perf_counter()
+        if not mask:
+            bound = self.fare(current, origin)
+        else:
+            remaining = [airport for airport in range(mask.bit_length()) if mask >> airport & 1]
+            from_current = self.fares_from(current)
+            bound = (min(from_current.get(airport, float("inf")) for airport in remaining) +
+                     self.tree_cost(remaining, mask) +
+                     min(self.fare(airport, origin) for airport in remaining))
+        self.memo[key] = bound
+        self.compute_time += time.perf_counter() - start
+        return bound
@@ -0,0 +1,100 @@
+# Python
+import csv
+import json
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+from .cache_manager import CacheManager
+from .flights import UserInputFlightsConnector
+
+# Fields a fare row must have; duration and airline fall back to the same defaults as manual entry
+REQUIRED_FIELDS = ("origin", "destination", "date", "price")
+DEFAULT_DURATION = "1h"
+DEFAULT_AIRLINE = "Alaska"
+
+
+def read_fare_rows(path: str) -> Iterator[Tuple[int, Union[Dict[str, Any], str]]]:
+    """
+    Streams (line number, row) pairs from a fare dump without loading it: a .jsonl file holds one JSON object per
+    line, yielded undecoded so a corrupt line only rejects that row; any other file is CSV with a header row naming
+    the fields, yielded as dicts. Blank JSONL lines are skipped.
+    """
+    with open(path, "r", newline="") as f:
+        if path.endswith(".jsonl"):
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    yield number, line
+        else:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def normalize_fare(row: Union[Dict[str, Any], str], connector: UserInputFlightsConnector,
+                   airlines: Dict[str, str]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Converts one raw row to the (cache key, result) add_flights.py would store for it, using the connector's price,
+    duration and airline parsing. Raises ValueError if a field is missing or cannot be parsed.
+    :param row: A CSV row, or a JSONL line as read_fare_rows yields it.
+    :param airlines: Memo of airline spellings already matched, shared across the rows of an import.
+    """
+    if isinstance(row, str):
+        row = json.loads(row)
+        if not isinstance(row, dict):
+            raise ValueError("A fare must be a JSON object.")
+    missing = [field for field in REQUIRED_FIELDS if row.get(field) in (None, "")]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}.")
+    origin = str(row["origin"]).strip().upper()
+    destination = str(row["destination"]).strip().upper()
+    date = datetime.strptime(str(row["date"]).strip(), "%Y-%m-%d").strftime("%Y-%m-%d")
+    transportation_mode = row.get("transportation_mode") or "flight"
+    payment_type = row.get("payment_type") or "money"
+    airline_input = str(row.get("airline") or DEFAULT_AIRLINE).strip()
+    airline = airlines.get(airline_input)
+    if airline is None:
+        airline = airlines[airline_input] = connector.match_airline(airline_input, interactive=False)
+    result = {"origin": origin, "destination": destination, "date": date,
+              "price": connector.parse_price(str(row["price"])),
+              "duration": connector.parse_duration(str(row.get("duration") or DEFAULT_DURATION)), "airline": airline}
+    return f"{origin}_{destination}_{date}_{transportation_mode}_{payment_type}", result
+
+
+def import_fares(cache_manager: CacheManager, connector: UserInputFlightsConnector, paths: Iterable[str],
+                 batch_size: int = 5000, progress: Callable[[Dict[str, Any]], None] = None,
+                 max_errors: int = 20) -> Dict[str, Any]:
+    """
+    Streams fare dumps into the cache, writing batch_size fares per transaction, so memory use stays flat however
+    large the files are. Rows that cannot be normalized are counted and skipped rather than stopping the import.
+    Returns a report with the rows read, fares written, rows rejected, the first max_errors error messages, elapsed
+    seconds and rows per second.
+    :param progress: Called with the report so far after every batch.
+    """
+    report = {"rows": 0, "written": 0, "rejected": 0, "errors": [], "seconds": 0.0, "rows_per_second": 0.0}
+    airlines = {}
+    start = time.perf_counter()
+    batch: List[Tuple[str, Dict[str, Any]]] = []
+
+    def flush():
+        cache_manager.set_many(batch)
+        report["written"] += len(batch)
+        batch.clear()
+        report["seconds"] = time.perf_counter() - start
+        report["rows_per_second"] = report["rows"] / report["seconds"] if report["seconds"] else 0.0
+        if progress is not None:
+            progress(report)
+
+    for path in paths:
+        for number, row in read_fare_rows(path):
+            report["rows"] += 1
+            try:
+                batch.append(normalize_fare(row, connector, airlines))
+            except (ValueError, TypeError, AttributeError) as e:
+                report["rejected"] += 1
+                if len(report["errors"]) < max_errors:
+                    report["errors"].append(f"{path}:{number}: {e}")
+            if len(batch) >= batch_size:
+                flush()
+    flush()
+    return report
@@ -0,0 +1,154 @@
+# Python
+import heapq
+import logging
+import time
+from typing import Dict, List, Tuple
+
+from .blocked_dates import BlockedDates
+from .leg_store import date_to_ordinal, ordinal_to_date
+from .search_stats import SearchStats
+
+logger = logging.getLogger(__name__)
+
+# A search state: (airport id, day ordinal, mask of destinations still to visit). At a destination the day is the
+# arrival day; anywhere else it is a day spent there, free to fly on or wait another day.
+State = Tuple[int, int, int]
+
+
+def flexible_start_search(graph, origin: str, destinations: Dict[str, Tuple[int, int]],
+                          constraints: Dict[str, List[Tuple[str, str]]], first_date: str, last_date: str,
+                          best_only: bool, stats: SearchStats) -> Dict[str, Tuple[List[Tuple[str, str, float]], float]]:
+    """
+    Cheapest itinerary for every first departure day from first_date to last_date, under the same rules as
+    find_least_cost_path, from a single search run backwards from the trip's end.
+    The search settles the exact cheapest completion of every state in order of that cost plus the cheapest fare
+    from the origin to the state's airport (a consistent bound on what reaching it costs), so each completion is
+    computed once and shared by every start day whose itineraries pass through it. A start day's answer is final once
+    the search has moved past its cost; the search stops when every start day that has a first leg is settled, or
+    with best_only, as soon as the cheapest one is.
+    :return: Start date -> (path, cost), with (None, inf) for days no itinerary starts on. With best_only, only the
+        cheapest start date.
+    """
+    phase_start = time.perf_counter()
+    store = graph.legs
+    first, last = date_to_ordinal(first_date), date_to_ordinal(last_date)
+    results = {ordinal_to_date(day): (None, float("inf")) for day in range(first, last + 1)}
+    origin_id = store.airport_ids.get(origin)
+    destination_ids = {dest: store.airport_ids.get(dest) for dest in destinations}
+    if origin_id is None or None in destination_ids.values():
+        return {} if best_only else results
+
+    stays = {destination_ids[dest]: days for dest, days in destinations.items()}
+    start_mask = 0
+    for dest_id in stays:
+        start_mask |= 1 << dest_id
+    blocked = BlockedDates(constraints, store.airport_ids)
+    reach = graph.fare_bounds().fares_from(origin_id)  # Cheapest fare from the origin to each airport
+    sources = {}  # Airport id -> [(source id, RouteLegs)] for the routes into it
+    arrival_days = {}  # Airport id -> days some leg arrives there
+    for source_id, by_destination in store.routes.items():
+        for destination_id, route in by_destination.items():
+            sources.setdefault(destination_id, []).append((source_id, route))
+            arrival_days.setdefault(destination_id, set()).update(route.dates)
+    first_arrival = {airport: min(days) for airport, days in arrival_days.items()}
+    origin_routes = store.routes_from(origin_id)
+    # Start days with at least one first leg; the others have no itinerary
+    pending = {day for day in range(first, last + 1) if not blocked.is_blocked(origin_id, day) and
+               any(route.window(day, day)[0] < route.window(day, day)[1] for route in origin_routes.values())}
+
+    completion = {}  # State -> cheapest cost of finishing the trip from it
+    onward = {}  # State -> (next state, path entry or None for waiting a day) on that cheapest way
+    best = {}  # Start day -> (cost, first state, first path entry)
+    # (cost + reach bound, cost, tie, state, next state, path entry); the trip ends on any day the origin is reached
+    # with nothing left to visit
+    pq = [(0.0, 0.0, 0, (origin_id, day, 0), None, None) for day in sorted(arrival_days.get(origin_id, ()))
+          if not blocked.is_blocked(origin_id, day)]
+    heapq.heapify(pq)
+    counter = len(pq)
+    popped = 0
+    max_heap = len(pq)
+
+    while pq:
+        priority, cost, _, state, next_state, entry = heapq.heappop(pq)
+        popped += 1
+        if state in completion:
+            continue
+        if best_only:
+            if best and min(total for total, _, _ in best.values()) <= priority:
+                break
+        else:
+            settled = {day for day in pending if day in best and best[day][0] <= priority}
+            pending -= settled
+            if not pending:
+                break
+        completion[state] = cost
+        onward[state] = (next_state, entry)
+        current, day, mask = state
+        code, date = store.airports[current], ordinal_to_date(day)
+
+        # Taking off from the origin on this day straight into this state
+        if first <= day <= last and mask == start_mask & ~(1 << current) and current != origin_id:
+            route = origin_routes.get(current)
+            if route is not None and not blocked.is_blocked(origin_id, day):
+                for i in range(*route.window(day, day)):
+                    if route.prices[i] + cost < best.get(day, (float("inf"),))[0]:
+                        best[day] = (route.prices[i] + cost, state, (code, date, route.prices[i]))
+
+        # States that lead here: the day before at the same pass-through airport...
+        predecessors = []
+        if current not in stays and day - 1 >= first_arrival.get(current, day) and not (
+                current == origin_id and not mask) and not blocked.is_blocked(current, day - 1):
+            predecessors.append(((current, day - 1, mask), 0.0, None))
+        # ...and every airport with a leg landing here today, from before or after this destination was visited
+        for prior_mask in ((mask, mask | 1 << current) if current in stays else (mask,)):
+            for source_id, route in sources.get(current, ()):
+                start, stop = route.window(day, day)
+                if start == stop or (source_id == origin_id and not prior_mask) or (
+                        source_id in stays and prior_mask >> source_id & 1):
+                    continue
+                if source_id in stays:
+                    min_days, max_days = stays[source_id]
+                    landed = arrival_days.get(source_id, ())
+                    prior_states = [(source_id, arrival, prior_mask) for arrival in
+                                    range(day - max_days, day - min_days + 1)
+                                    if arrival in landed and not blocked.any_blocked(source_id, arrival, day)]
+                elif blocked.is_blocked(source_id, day):
+                    continue
+                else:
+                    prior_states = [(source_id, day, prior_mask)]
+                for i in range(start, stop):
+                    for prior in prior_states:
+                        predecessors.append((prior, route.prices[i], (code, date, route.prices[i])))
+
+        for prior, price, prior_entry in predecessors:
+            if prior in completion:
+                continue
+            bound = reach.get(prior[0], float("inf"))
+            if bound == float("inf"):
+                continue  # Not reachable from the origin at all
+            counter += 1
+            heapq.heappush(pq, (cost + price + bound, cost + price, counter, prior, state, prior_entry))
+        max_heap = max(max_heap, len(pq))
+
+    stats.popped += popped
+    stats.expanded += len(completion)
+    stats.pushed += counter
+    stats.max_heap = max(stats.max_heap, max_heap)
+    stats.states += len(completion)
+    stats.completed += len(best)
+    stats.add_time("search", time.perf_counter() - phase_start)
+
+    for day, (total, state, entry) in best.items():
+        path = [entry]
+        while state is not None:
+            state, entry = onward[state]
+            if entry is not None:
+                path.append(entry)
+        results[ordinal_to_date(day)] = (path, total)
+    if best_only:
+        if not best:
+            logger.info("No valid path found.")
+            return {}
+        day = min(best, key=lambda start_day: best[start_day][0])
+        return {ordinal_to_date(day): results[ordinal_to_date(day)]}
+    return results
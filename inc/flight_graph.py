@@ -1,131 +1,810 @@
 # Python
+import cProfile
 import heapq
-from datetime import datetime
-from typing import Dict, List, Tuple
+from bisect import insort
+import logging
+import pstats
+import time
+from typing import Any, Callable, Dict, Iterator, List, Tuple
 import json
 import os
 
+from .blocked_dates import BlockedDates
+from .cache_manager import CacheManager
+from .connection_index import ConnectionIndex
+from .fare_bounds import FareBounds
+from .flexible_start import flexible_start_search
+from .graph_snapshot import load_snapshot, save_snapshot
+from .greedy_tour import greedy_tour
+from .leg_store import LegStore, date_to_ordinal, minutes_to_duration, ordinal_to_date
+from .parallel_search import parallel_least_cost_path
+from .reachability import Reachability
+from .search_memo import SearchMemo, SuffixLookup
+from .search_stats import SearchStats
+
+logger = logging.getLogger(__name__)
+
+# Observer for search events, called as hook(event, **details)
+SearchHook = Callable[..., None]
+
+
+class PathNode:
+    """
+    One flight of a partial itinerary on the search frontier, linked to the flight before it. Entries that extend the
+    same itinerary share its nodes, so a push allocates one small node instead of copying the whole path.
+    """
+    __slots__ = ("parent", "airport", "date", "price")
+
+    def __init__(self, parent: "PathNode", airport: int, date: int, price: float):
+        self.parent = parent  # None for the first flight
+        self.airport = airport  # Airport id flown to
+        self.date = date  # Departure ordinal
+        self.price = price
+
+    def path(self, airports: List[str]) -> List[Tuple[str, str, float]]:
+        """Rebuilds the (location, date, cost) path ending with this flight."""
+        path = []
+        node = self
+        while node is not None:
+            path.append((airports[node.airport], ordinal_to_date(node.date), node.price))
+            node = node.parent
+        path.reverse()
+        return path
+
 
 # Python
 class FlightGraph:
 
     def __init__(self, cache_dir: str):
-        self.graph = {}  # Dictionary to store nodes and edges
+        self.legs = LegStore()  # Columnar leg storage indexed by (origin, destination)
         self.cache_dir = cache_dir
+        self.search_stats = SearchStats()  # Counters from the most recent search
+        self.version = 0  # Bumped whenever legs change so derived tables know to rebuild
+        self.cache_backend = None  # Backend class the legs were synced from
+        self.cache_marker = None  # Backend change marker the legs are current up to
+        self._fare_bounds = {}  # Weight -> FareBounds
+        self._fare_bounds_version = -1
+        self._connections = None  # ConnectionIndex, built on first use and then updated leg by leg
+        self._memo = None  # SearchMemo, created by the first memoized search and then told about every leg change
+
+    def add_leg(self, origin: str, destination: str, date: str, price: float, duration: str, airline: str,
+                key: str = None):
+        """Adds a journey leg to the graph. A leg added under a cache key replaces the earlier leg for that key."""
+        if key is not None and (self._connections is not None or self._memo is not None):
+            self.remove_leg(key)  # So the connection index and the memo forget the replaced leg too
+        self.legs.add(origin, destination, date, price, duration, airline, key)
+        self.version += 1
+        origin_id, destination_id = self.legs.airport_ids[origin], self.legs.airport_ids[destination]
+        if self._connections is not None:
+            self._connections.add_leg(origin_id, destination_id, date_to_ordinal(date))
+        if self._memo is not None:
+            self._memo.record_change(True, (origin_id, destination_id, date_to_ordinal(date), price))
 
-    def add_leg(self, origin: str, destination: str, date: str, price: float, duration: str, airline: str):
-        """Adds a journey leg to the graph."""
-        if origin not in self.graph:
-            self.graph[origin] = []
-        self.graph[origin].append(
-            {"destination": destination, "date": date, "price": price, "duration": duration, "airline": airline})
+    def remove_leg(self, key: str) -> bool:
+        """Removes the leg that was added under a cache key. Returns False if there is none."""
+        leg = self.legs.key_leg(key)
+        if leg is None:
+            return False
+        self.legs.remove_key(key)
+        self.version += 1
+        if self._connections is not None:
+            self._connections.remove_leg(*leg[:3])
+        if self._memo is not None:
+            self._memo.record_change(False, leg)
+        return True
+
+    def sync_cache(self, cache_manager: CacheManager) -> int:
+        """
+        Brings the graph up to date with the fare cache, applying only the entries written or deleted since the last
+        sync (or since the snapshot this graph was loaded from). Returns the number of changes applied.
+        """
+        backend = type(cache_manager.backend).__name__
+        if self.cache_backend is not None and backend != self.cache_backend:
+            # Synced from a different store, so start over
+            self.legs = LegStore()
+            self.version += 1
+            self.cache_marker = None
+            self._connections = None
+            self._memo = None
+        entries, deleted, self.cache_marker = cache_manager.backend.changes_since(
+            self.cache_marker, [key for key in self.legs.keys if key is not None])
+        self.cache_backend = backend
+        changes = 0
+        for key in deleted:
+            changes += self.remove_leg(key)
+        for key, _, cached_data in entries:
+            if "origin" not in cached_data:
+                continue  # Connector lookups cached by TravelSearch.search are not fares
+            leg = (cached_data["origin"].upper(), cached_data["destination"].upper(), cached_data["date"],
+                   cached_data["price"], cached_data["duration"], cached_data["airline"])
+            if self.legs.holds(key, *leg):
+                continue  # Re-read but unchanged, e.g. a file sharing the marker's mtime
+            self.add_leg(*leg, key)
+            changes += 1
+        return changes
+
+    def save_snapshot(self, path: str):
+        """Writes the legs and the cache marker they are current up to into a binary snapshot."""
+        self.legs.compact_keys()
+        save_snapshot(self.legs, path, {"version": self.version, "cache_backend": self.cache_backend,
+                                        "cache_marker": self.cache_marker})
+
+    @classmethod
+    def load_snapshot(cls, path: str, cache_dir: str) -> "FlightGraph":
+        """Loads a graph saved by save_snapshot. Call sync_cache afterwards to pick up newer cache entries."""
+        graph = cls(cache_dir)
+        graph.legs, metadata = load_snapshot(path)
+        graph.version = metadata["version"]
+        graph.cache_backend = metadata["cache_backend"]
+        graph.cache_marker = metadata["cache_marker"]
+        return graph
+
+    @classmethod
+    def from_cache(cls, cache_manager: CacheManager, snapshot_path: str = None) -> "FlightGraph":
+        """
+        Builds the graph for a fare cache. With a snapshot path, starts from the saved snapshot when one is readable,
+        applies only the cache changes made since it was written, and saves it again if anything changed.
+        """
+        graph = None
+        if snapshot_path and os.path.exists(snapshot_path):
+            try:
+                graph = cls.load_snapshot(snapshot_path, cache_manager.cache_dir)
+            except (ValueError, KeyError, OSError) as e:
+                logger.warning(f"Ignoring unreadable graph snapshot: {e}")
+        if graph is None:
+            graph = cls(cache_manager.cache_dir)
+        changes = graph.sync_cache(cache_manager)
+        if snapshot_path and (changes or not os.path.exists(snapshot_path)):
+            graph.save_snapshot(snapshot_path)
+        return graph
+
+    def fare_bounds(self, weight: str = "price") -> FareBounds:
+        """Returns the min-fare (or min-duration) lower-bound tables for the current legs, rebuilt after any change."""
+        if self._fare_bounds_version != self.version:
+            self._fare_bounds = {}
+            self._fare_bounds_version = self.version
+        bounds = self._fare_bounds.get(weight)
+        if bounds is None:
+            bounds = self._fare_bounds[weight] = FareBounds(self.legs, weight)
+        return bounds
+
+    def connection_index(self, min_connection_minutes: int = None, max_layover_days: int = None,
+                         per_slot: int = None) -> ConnectionIndex:
+        """
+        Returns the one-stop connection index used by routing="connections" searches, building it on first use. Rules
+        given here rebuild it if they differ from the current ones; rules left out keep their current values (see
+        ConnectionIndex for the defaults).
+        """
+        rules = {"min_connection_minutes": min_connection_minutes, "max_layover_days": max_layover_days,
+                 "per_slot": per_slot}
+        current = self._connections
+        if current is not None:
+            if all(value is None or getattr(current, rule) == value for rule, value in rules.items()):
+                return current
+            rules = {rule: getattr(current, rule) if value is None else value for rule, value in rules.items()}
+        self._connections = ConnectionIndex(self.legs, **{rule: value for rule, value in rules.items()
+                                                          if value is not None})
+        return self._connections
+
+    def search_memo(self) -> SearchMemo:
+        """Returns the memo of solved queries and suffix tours kept for memoized searches, creating it if needed."""
+        if self._memo is None:
+            self._memo = SearchMemo(self)
+        return self._memo
 
     def get_legs(self, origin: str) -> List[Dict]:
         """Returns all journey legs from a given origin."""
-        return self.graph.get(origin, [])
+        return list(self.legs.iter_legs(origin))
 
     def heuristic(self, origin, current: str, destinations: List[str]) -> float:
         """Heuristic function estimating the cost to visit remaining destinations."""
-        remaining_destinations = set(destinations)
-        legs = self.graph.get(current, [])
-        prices = [leg["price"] for leg in legs if leg["destination"] in remaining_destinations]
+        airport_ids = self.legs.airport_ids
+        routes = self.legs.routes_from(airport_ids.get(current))
+        remaining_ids = {airport_ids.get(dest) for dest in destinations}
+        prices = [route.min_price for dest_id, route in routes.items() if dest_id in remaining_ids]
         if prices:
             return min(prices)  # Return the minimum price to any remaining destination
         else:
             if current != origin:
-                legs = self.graph.get(current, [])
-                prices = [leg["price"] for leg in legs if leg["destination"] == origin]
-                if prices:
-                    return min(prices)
+                route = routes.get(airport_ids.get(origin))
+                if route is not None:
+                    return route.min_price
             else:
                 return 0
 
         return float("inf")  # If no legs available, return infinity
 
-    # TODO: possible for date constraints to be fully within visit, this will not catch that
+    @staticmethod
+    def _departure_window(current: int, current_date: int, stays: Dict[int, Tuple[int, int]],
+                          blocked: BlockedDates) -> Tuple[int, int, int]:
+        """
+        Returns the (earliest, latest) departure ordinals for leaving current after arriving on current_date, and the
+        last day the stay may run to before a blocked day (or None). The window is the visit length for destinations
+        and any later date when passing through elsewhere; None leaves a side open.
+        """
+        if current_date is None:
+            return None, None, None
+        if current in stays:
+            min_days, max_days = stays[current]
+            earliest, latest = current_date + min_days, current_date + max_days
+        else:
+            earliest, latest = current_date, None
+        clip = None
+        if current in blocked:
+            # The stay runs from arrival to departure, so it has to end before the next blocked day
+            next_blocked = blocked.next_blocked(current, current_date)
+            if next_blocked is not None and (latest is None or next_blocked <= latest):
+                clip = next_blocked - 1
+        return earliest, latest, clip
+
     # Python
     def find_least_cost_path(self, origin: str, destinations: Dict[str, Tuple[int, int]],
-                             constraints: Dict[str, List[Tuple[str, str]]]) -> Tuple[
-        List[Tuple[str, str, float]], float]:
+                             constraints: Dict[str, List[Tuple[str, str]]], dedupe_states: bool = True,
+                             bound: str = "mst", stats: SearchStats = None, hook: SearchHook = None,
+                             profile: bool = False, workers: int = 1, seed: bool = True, deadline: float = None,
+                             max_expansions: int = None, routing: str = "legs",
+                             memo: bool = False) -> Tuple[List[Tuple[str, str, float]], float]:
         """
         Finds the least-cost path visiting all destinations using A* search.
         :param origin: Starting point of the journey.
         :param destinations: Dictionary of destinations with visit length constraints (e.g., {"NYC": (2, 5)}).
+        :param constraints: Blocked (start_date, end_date) ranges per airport, inclusive. No stay may overlap a blocked
+            range, including one that falls entirely between arrival and departure.
+        :param dedupe_states: Keep only the cheapest arrival per (city, date, visited destinations) state, Held-Karp
+            style. Every ordering that reaches the same state has the same future, so this never changes the optimum.
+        :param bound: "mst" for the precomputed spanning-tree lower bound over the remaining destinations and the
+            return home, or "legacy" for the single-hop heuristic.
+        :param stats: SearchStats to fill in; a new one is created otherwise. Either way it is kept as search_stats.
+        :param hook: Called as hook(event, **details) for "expand", "push", "prune" and "complete" events. Prune
+            events carry the reason (see search_stats.PRUNE_REASONS) and how many legs or entries were dropped.
+        :param profile: Run the search under cProfile and keep the result on stats.profile.
+        :param workers: Number of worker processes; above 1 the search is split by first airport across a process
+            pool sharing the best cost found (see parallel_search). Statistics are summed over the workers, and
+            profiling only covers the coordinating process.
+        :param seed: Start from a greedy itinerary (see greedy_tour) so its cost prunes the search from the outset.
+        :param deadline: Seconds after which to stop and return the best itinerary found so far.
+        :param max_expansions: Number of expansions after which to stop likewise (per worker when workers > 1).
+            When a budget stops the search, stats.stopped_early is set and stats.gap bounds how far the returned
+            itinerary can be from the optimum. The gap relies on the admissible "mst" bound.
+        :param routing: "legs" to fly leg by leg, passing through any airport, or "connections" to move only between
+            the origin and the destinations, each hop a direct leg or a one-stop connection from connection_index().
+            Far fewer states are explored, but itineraries needing two or more hubs in a row are not considered.
+        :param memo: Answer from, and add to, the graph's search_memo(): a query solved before is answered without
+            searching if no fare change since could affect it, and a single-process search completes any state it
+            reaches whose cheapest suffix tour an earlier query found. Searches with a hook or profiling bypass it, as
+            do "legacy" bound searches, whose answers are not proven optimal.
         :return: Tuple containing the best path and its cost.
         """
-        print("Starting A* search...")
-        pq = [(0, 0, origin, [], None,
-               destinations)]  # (priority, current_node, path, current_date, remaining_destinations)
+        if bound not in ("mst", "legacy"):
+            raise ValueError(f"Unknown bound '{bound}'.")
+        if routing not in ("legs", "connections"):
+            raise ValueError(f"Unknown routing '{routing}'.")
+        if workers > 1 and hook is not None:
+            raise ValueError("Search hooks cannot observe a multi-process search.")
+        if workers > 1 and routing != "legs":
+            raise ValueError("Connection routing is only supported by the single-process search.")
+        stats = stats if stats is not None else SearchStats()
+        self.search_stats = stats
+        stop_at = None if deadline is None else time.monotonic() + deadline
+        connections = self.connection_index() if routing == "connections" else None
+        search_memo = query = suffixes = None
+        if memo and bound == "mst" and hook is None and not profile:
+            search_memo = self.search_memo()
+            rules = routing if connections is None else (routing, connections.min_connection_minutes,
+                                                         connections.max_layover_days, connections.per_slot)
+            query = search_memo.query_key(origin, destinations, constraints, rules)
+            solved = search_memo.result(query)
+            if solved is not None:
+                logger.info(f"Answered from the search memo: {solved[0]}, Total cost: {solved[1]}")
+                stats.memo_hits += 1
+                stats.record_bounds(solved[1], solved[1], False)
+                return solved
+            if connections is None:
+                suffixes = search_memo.suffix_lookup(query)
+        if workers > 1:
+            search = parallel_least_cost_path
+            args = (self, origin, destinations, constraints, dedupe_states, bound, stats, workers, seed, stop_at,
+                    max_expansions)
+        else:
+            search = self._find_least_cost_path
+            args = (origin, destinations, constraints, dedupe_states, bound, stats, hook, seed, stop_at,
+                    max_expansions, None, None, connections, suffixes)
+        if profile:
+            profiler = cProfile.Profile()
+            result = profiler.runcall(search, *args)
+            stats.profile = pstats.Stats(profiler)
+            return result
+        result = search(*args)
+        if search_memo is not None and not stats.stopped_early:
+            # Suffixes are read off the path by destination, which connection hops through a hub would confuse
+            search_memo.store(query, destinations, result[0], result[1], suffixes=connections is None)
+        return result
+
+    def _find_least_cost_path(self, origin: str, destinations: Dict[str, Tuple[int, int]],
+                              constraints: Dict[str, List[Tuple[str, str]]], dedupe_states: bool, bound: str,
+                              stats: SearchStats, hook: SearchHook, seed: bool = False, stop_at: float = None,
+                              max_expansions: int = None, first_legs: set = None, shared_best=None,
+                              connections: ConnectionIndex = None,
+                              suffixes: SuffixLookup = None) -> Tuple[List[Tuple[str, str, float]], float]:
+        """
+        The search loop. stop_at is a time.monotonic() deadline. A parallel worker passes the (airport id, date ordinal)
+        first legs it may take, and a shared multiprocessing.Value through which it prunes against, and publishes to,
+        the best cost found by any worker. With a connection index, hops go only to the remaining destinations (or
+        home once none remain), over direct legs and the index's one-stop connections. With a suffix lookup, a
+        destination state whose cheapest way home is already known is completed with it instead of being pushed.
+        Leg by leg, states from which the calendar leaves no way to finish (see Reachability) are never pushed.
+        """
+        logger.info("Starting A* search...")
+        debug = logger.isEnabledFor(logging.DEBUG)
+        phase_start = time.perf_counter()
+        store = self.legs
+        bounds = self.fare_bounds() if bound == "mst" else None
+        blocked = BlockedDates(constraints, store.airport_ids)
+        origin_id = store.airport_ids.get(origin)
+        destination_ids = {dest: store.airport_ids.get(dest) for dest in destinations}
+        if origin_id is None or None in destination_ids.values():
+            logger.info("No valid path found.")
+            return None, float("inf")
+
+        # Visit-length windows keyed by airport id; each destination owns the bit of its airport id and a state's
+        # mask holds the destinations still to visit
+        stays = {destination_ids[dest]: days for dest, days in destinations.items()}
+        start_mask = 0
+        for dest_id in stays:
+            start_mask |= 1 << dest_id
+        best_state_cost = {(origin_id, None, start_mask): 0}
+        counter = 0  # Tie-breaker so the heap never compares nodes
+        # The root's priority is only read back as the lower bound of a search stopped before it was expanded
+        root_bound = bounds.lower_bound(origin_id, origin_id, start_mask) if bounds is not None else 0
+        pq = [(root_bound, 0, counter, origin_id, None, None,
+               start_mask)]  # (priority, cost, tie, current_node, PathNode or None at the start, current_date, mask)
         best_path = None
-        best_cost = float("inf")
+        best_cost = float("inf")  # Pruning threshold; lower than best_path_cost once another worker did better
+        best_path_cost = float("inf")
+        reach = None
+        if connections is None:
+            now = time.perf_counter()
+            stats.add_time("setup", now - phase_start)
+            phase_start = now
+            reach = Reachability(store, origin_id, stays, blocked, len(stays))
+            now = time.perf_counter()
+            stats.add_time("reachability", now - phase_start)
+            phase_start = now
+        if seed:
+            now = time.perf_counter()
+            stats.add_time("setup", now - phase_start)
+            phase_start = now
+            best_path, best_cost = greedy_tour(self, origin_id, stays, blocked, stop_at, connections)
+            best_path_cost = best_cost
+            logger.info(f"Greedy itinerary: {best_path}, Total cost: {best_cost}")
+            now = time.perf_counter()
+            stats.add_time("seed", now - phase_start)
+            phase_start = now
+        budgeted = stop_at is not None or max_expansions is not None
+        stopped = False
+        popped = expanded = 0
+        max_heap = 1
+        # Prune counts stay in locals inside the loop and are folded into stats at the end
+        cost_pruned = visit_pruned = constraint_pruned = dominated_pruned = stale_pruned = unreachable_pruned = 0
+        memo_hits = 0
+        bound_time = bounds.compute_time if bounds is not None else 0.0
+        now = time.perf_counter()
+        stats.add_time("setup", now - phase_start)
+        phase_start = now
 
         while pq:
-            priority, cost, current, path, current_date, remaining_destinations = heapq.heappop(pq)
+            if budgeted and ((max_expansions is not None and expanded >= max_expansions) or (
+                    stop_at is not None and not popped % 64 and time.monotonic() >= stop_at)):
+                stopped = True
+                break
+            priority, cost, _, current, node, current_date, mask = heapq.heappop(pq)
+            popped += 1
+            if shared_best is not None and not popped % 64:
+                best_cost = min(best_cost, shared_best.value)
 
             if cost >= best_cost:
-                # print(f"Skipping node {current} due to cost: {cost} >= best cost: {best_cost}")
+                cost_pruned += 1
+                if hook is not None:
+                    hook("prune", reason="cost_bound", city=store.airports[current], date=current_date, count=1)
                 continue
 
-            # print(f"Exploring node: {current}, Cost: {cost}, Remaining destinations: {remaining_destinations}")
+            if dedupe_states and cost > best_state_cost.get((current, current_date, mask), float("inf")):
+                # A cheaper route to this exact state was found after this entry was pushed
+                stale_pruned += 1
+                if hook is not None:
+                    hook("prune", reason="stale", city=store.airports[current], date=current_date, count=1)
+                continue
 
-            if not remaining_destinations and current == origin:
-                print(f"Completed path: {path}, Total cost: {cost}")
+            expanded += 1
+            if debug:
+                remaining = [store.airports[dest_id] for dest_id in stays if mask >> dest_id & 1]
+                logger.debug(f"Exploring node: {store.airports[current]}, Cost: {cost}, "
+                             f"Remaining destinations: {remaining}")
+            if hook is not None:
+                hook("expand", city=store.airports[current], date=current_date, cost=cost, priority=priority)
+
+            if not mask and current == origin_id:
+                path = node.path(store.airports) if node is not None else []
+                logger.info(f"Completed path: {path}, Total cost: {cost}")
                 if cost < best_cost:
                     best_path = path
-                    best_cost = cost
+                    best_cost = best_path_cost = cost
+                    stats.completed += 1
+                    if shared_best is not None:
+                        with shared_best.get_lock():
+                            shared_best.value = min(shared_best.value, cost)
+                    if hook is not None:
+                        hook("complete", path=path, cost=cost)
                 continue
 
-            for leg in self.graph.get(current, []):
-                leg_date = datetime.strptime(leg["date"], "%Y-%m-%d")
-                if current_date:
-                    previous_date = datetime.strptime(current_date, "%Y-%m-%d")
-                    visit_length = (leg_date - previous_date).days
-
-                    # Check if visit length matches the constraint
-                    if current in destinations:
-                        min_days, max_days = destinations[current]
-                        if not (min_days <= visit_length <= max_days):
-                            # print(f"Skipping leg due to invalid visit length: {visit_length} days")
-                            continue
+            earliest, latest, clip = self._departure_window(current, current_date, stays, blocked)
+            check_departure = current_date is None and current in blocked
+            allowed_first_legs = first_legs if current_date is None else None
+            if reach is not None:
+                cutoff = reach.latest_departure(current, mask.bit_count())
 
-                # print(f"Checking leg from: {current} to: {leg['destination']}, Date: {leg['date']}")
-                if current in constraints:
-                    if self.date_violates_constraints(leg_date, constraints[current]):
+            if bounds is None:
+                remaining_codes = [store.airports[dest_id] for dest_id in stays if mask >> dest_id & 1]
+            if connections is None:
+                hops = store.routes_from(current).items()
+            else:
+                hops = self._stop_hops(current, [dest_id for dest_id in stays if mask >> dest_id & 1] or [origin_id],
+                                       connections)
+            for next_id, route in hops:
+                next_code = store.airports[next_id]
+                hubs = getattr(route, "hubs", None)  # Set for one-stop connections
+                start, stop = route.window(earliest, latest)
+                outside, clipped = len(route) - (stop - start), 0
+                if clip is not None:
+                    clipped_stop = max(start, route.window(None, clip)[1])
+                    clipped, stop = stop - clipped_stop, clipped_stop
+                unreachable = 0
+                if reach is not None:
+                    reachable_stop = min(stop, max(start, route.window(None, cutoff)[1]))
+                    unreachable, stop = stop - reachable_stop, reachable_stop
+                visit_pruned += outside
+                constraint_pruned += clipped
+                unreachable_pruned += unreachable
+                if hook is not None:
+                    for reason, count in (("visit_length", outside), ("constraint", clipped),
+                                          ("unreachable", unreachable)):
+                        if count:
+                            hook("prune", reason=reason, city=next_code, date=None, count=count)
+                if start >= stop:
+                    continue
+
+                next_mask = mask & ~(1 << next_id)
+                next_remaining = next_mask.bit_count()
+                if bounds is not None:
+                    heuristic_cost = bounds.lower_bound(origin_id, next_id, next_mask)
+                else:
+                    heuristic_cost = self.heuristic(origin, next_code, remaining_codes)
+                if cost + route.prices[route.cheapest(start, stop)] + heuristic_cost >= best_cost:
+                    # Not even the cheapest leg in the window can beat the best itinerary
+                    cost_pruned += stop - start
+                    if hook is not None:
+                        hook("prune", reason="cost_bound", city=next_code, date=None, count=stop - start)
+                    continue
+                check_arrival = next_id in blocked
+                for i in range(start, stop):
+                    leg_ordinal = route.dates[i]
+                    arrival = leg_ordinal if hubs is None else route.arrivals[i]
+                    if allowed_first_legs is not None and (next_id, leg_ordinal) not in allowed_first_legs:
+                        continue  # Another worker's share of the search
+                    if (check_departure and blocked.is_blocked(current, leg_ordinal)) or (
+                            check_arrival and blocked.is_blocked(next_id, arrival)) or (
+                            hubs is not None and blocked.any_blocked(hubs[i], leg_ordinal, arrival)):
+                        constraint_pruned += 1
+                        if hook is not None:
+                            hook("prune", reason="constraint", city=next_code, date=arrival, count=1)
                         continue
-                if leg["destination"] in constraints:
-                    if self.date_violates_constraints(leg_date, constraints[leg["destination"]]):
+                    if reach is not None and not reach.completable(next_id, arrival, next_remaining):
+                        unreachable_pruned += 1
+                        if hook is not None:
+                            hook("prune", reason="unreachable", city=next_code, date=arrival, count=1)
                         continue
 
-                next_cost = cost + leg["price"]  # Actual cost of the path
-                heuristic_cost = self.heuristic(origin, leg["destination"], list(remaining_destinations.keys()))
-                next_path = path + [(leg["destination"], leg["date"], leg["price"])]
-                next_remaining = {dest: days for dest, days in remaining_destinations.items() if
-                                  dest != leg["destination"]}
+                    next_cost = cost + route.prices[i]  # Actual cost of the path
+                    if next_cost + heuristic_cost >= best_cost:
+                        cost_pruned += 1
+                        if hook is not None:
+                            hook("prune", reason="cost_bound", city=next_code, date=arrival, count=1)
+                        continue
 
-                if next_cost + heuristic_cost >= best_cost:
-                    # print(f"Skipping leg due to cost: {next_cost + heuristic_cost} >= {best_cost}")
-                    continue
+                    if dedupe_states:
+                        state = (next_id, arrival, next_mask)
+                        if next_cost >= best_state_cost.get(state, float("inf")):
+                            dominated_pruned += 1
+                            if hook is not None:
+                                hook("prune", reason="dominated", city=next_code, date=arrival, count=1)
+                            continue
+                        best_state_cost[state] = next_cost
+
+                    if hubs is None:
+                        next_node = PathNode(node, next_id, leg_ordinal, route.prices[i])
+                    else:
+                        next_node = PathNode(PathNode(node, hubs[i], leg_ordinal, route.first_prices[i]), next_id,
+                                             arrival, route.second_prices[i])
+                    if suffixes is not None and next_id in stays:
+                        known = suffixes(next_id, arrival, next_mask)
+                        if known is not None:
+                            # The rest of the trip from here is already solved, so there is nothing to expand
+                            memo_hits += 1
+                            if next_cost + known[0] < best_cost:
+                                best_path = next_node.path(store.airports) + known[1]
+                                best_cost = best_path_cost = next_cost + known[0]
+                                stats.completed += 1
+                            continue
 
-                # print(f"Pushing to queue: Destination: {leg['destination']}, Cost: {next_cost}, Heuristic: {
-                # heuristic_cost}")
-                heapq.heappush(pq, (next_cost + heuristic_cost, next_cost, leg["destination"], next_path, leg["date"],
-                                    next_remaining))
+                    counter += 1
+                    heapq.heappush(pq, (next_cost + heuristic_cost, next_cost, counter, next_id, next_node,
+                                        arrival, next_mask))
+                    max_heap = max(max_heap, len(pq))
+                    if hook is not None:
+                        hook("push", city=next_code, date=arrival, cost=next_cost, bound=heuristic_cost)
 
+        stats.popped += popped
+        stats.expanded += expanded
+        stats.pushed += counter
+        stats.max_heap = max(stats.max_heap, max_heap)
+        stats.states += len(best_state_cost)
+        stats.memo_hits += memo_hits
+        for reason, count in (("cost_bound", cost_pruned), ("visit_length", visit_pruned),
+                              ("constraint", constraint_pruned), ("dominated", dominated_pruned),
+                              ("stale", stale_pruned), ("unreachable", unreachable_pruned)):
+            stats.pruned[reason] += count
+        # Bound tables fill lazily during the loop; that time is reported as its own phase
+        bound_time = bounds.compute_time - bound_time if bounds is not None else 0.0
+        stats.add_time("bound", bound_time)
+        stats.add_time("search", time.perf_counter() - phase_start - bound_time)
+        # Every itinerary not yet found extends an entry still on the heap, whose priority is a lower bound on it
+        stats.record_bounds(min(best_cost, pq[0][0]) if stopped else best_cost, best_path_cost, stopped)
+        if stopped:
+            logger.info(f"Search budget exhausted; optimality gap {stats.gap}")
         if best_path is None:
-            print("No valid path found.")
-        return best_path, best_cost
+            logger.info("No valid path found.")
+        return best_path, best_path_cost
+
+    def find_by_start_date(self, origin: str, destinations: Dict[str, Tuple[int, int]],
+                           constraints: Dict[str, List[Tuple[str, str]]], first_date: str, last_date: str,
+                           best_only: bool = False,
+                           stats: SearchStats = None) -> Dict[str, Tuple[List[Tuple[str, str, float]], float]]:
+        """
+        Finds the cheapest itinerary for each first departure date from first_date to last_date (inclusive) in one
+        search that shares the cheapest completion of every (city, date, remaining destinations) state between the
+        start dates, instead of one find_least_cost_path per date (see flexible_start).
+        :param best_only: Only return the cheapest start date, which lets the search stop earlier.
+        :return: Start date -> (path, cost); (None, inf) for dates no itinerary starts on.
+        """
+        stats = stats if stats is not None else SearchStats()
+        self.search_stats = stats
+        logger.info(f"Starting flexible-date search from {first_date} to {last_date}...")
+        return flexible_start_search(self, origin, destinations, constraints, first_date, last_date, best_only, stats)
+
+    def _stop_hops(self, current: int, targets: List[int], connections: ConnectionIndex) -> Iterator[Tuple[int, Any]]:
+        """Yields (target id, RouteLegs or ConnectionLegs) for the direct legs and connections to each target."""
+        for target in targets:
+            if target == current:
+                continue
+            for route in (self.legs.route(current, target), connections.route(current, target)):
+                if route is not None:
+                    yield target, route
 
-    def date_violates_constraints(self, date: datetime, constraints: List[Tuple[str, str]]) -> bool:
+    def find_itineraries(self, origin: str, destinations: Dict[str, Tuple[int, int]],
+                         constraints: Dict[str, List[Tuple[str, str]]], k: int = 3, objective: str = "price",
+                         stats: SearchStats = None,
+                         hook: SearchHook = None) -> List[Tuple[List[Tuple[str, str, float]], float, int]]:
         """
-        Checks if a given date is within any of the date constraints.
-        :param date: Date to check in YYYY-MM-DD format.
-        :param constraints: Dictionary of constraints with destination as key and list of (start_date, end_date) tuples.
-        :return: True if the date is within any constraint, False otherwise.
+        Finds several itineraries in a single A* pass that shares the frontier and the lower bounds between them.
+        :param k: Number of itineraries to return for the "price" objective.
+        :param objective: "price" for the k cheapest distinct itineraries, or "pareto" for every itinerary that no
+            other beats on both price and total flight time.
+        The remaining parameters are as for find_least_cost_path. The MST bound is always used: results are emitted as
+        complete itineraries come off the heap, which is only in order of cost when the bound is admissible.
+        :return: (path, cost, total flight minutes) per itinerary, cheapest first. Pareto results therefore come out
+            slowest first.
         """
+        if objective not in ("price", "pareto"):
+            raise ValueError(f"Unknown objective '{objective}'.")
+        if k < 1:
+            raise ValueError("k must be at least 1.")
+        stats = stats if stats is not None else SearchStats()
+        self.search_stats = stats
+        return self._find_itineraries(origin, destinations, constraints, k, objective == "pareto", stats, hook)
+
+    @staticmethod
+    def _add_label(labels: Dict[Tuple[int, int, int], List[Tuple[float, int]]], state: Tuple[int, int, int],
+                   cost: float, minutes: int, k: int, pareto: bool) -> bool:
+        """
+        Records a (cost, minutes) label for reaching a state unless the labels already there make it useless: k
+        cheaper ones for the price objective, or one no worse on both counts for Pareto. Returns whether it was kept.
+        Any way of finishing the trip from the state extends those labels just as well, so dropping it is safe.
+        """
+        state_labels = labels.get(state)
+        if state_labels is None:
+            labels[state] = [(cost, minutes)]
+            return True
+        if pareto:
+            if any(other_cost <= cost and other_minutes <= minutes for other_cost, other_minutes in state_labels):
+                return False
+            state_labels[:] = [(other_cost, other_minutes) for other_cost, other_minutes in state_labels
+                               if other_cost < cost or other_minutes < minutes]
+            state_labels.append((cost, minutes))
+            return True
+        if len(state_labels) >= k and cost >= state_labels[-1][0]:
+            return False
+        insort(state_labels, (cost, minutes))
+        del state_labels[k:]
+        return True
+
+    def _find_itineraries(self, origin: str, destinations: Dict[str, Tuple[int, int]],
+                          constraints: Dict[str, List[Tuple[str, str]]], k: int, pareto: bool, stats: SearchStats,
+                          hook: SearchHook) -> List[Tuple[List[Tuple[str, str, float]], float, int]]:
+        logger.info("Starting A* search for the price/duration frontier..." if pareto else
+                    f"Starting A* search for the {k} cheapest itineraries...")
+        debug = logger.isEnabledFor(logging.DEBUG)
+        phase_start = time.perf_counter()
+        store = self.legs
+        bounds = self.fare_bounds()
+        # Pareto pruning also needs a lower bound on the flight time still to come
+        time_bounds = self.fare_bounds("duration") if pareto else None
+        blocked = BlockedDates(constraints, store.airport_ids)
+        origin_id = store.airport_ids.get(origin)
+        destination_ids = {dest: store.airport_ids.get(dest) for dest in destinations}
+        if origin_id is None or None in destination_ids.values():
+            logger.info("No valid path found.")
+            return []
+
+        stays = {destination_ids[dest]: days for dest, days in destinations.items()}
+        start_mask = 0
+        for dest_id in stays:
+            start_mask |= 1 << dest_id
+        # Labels per (city, date, remaining mask) state replace the single best cost used by find_least_cost_path
+        labels = {(origin_id, None, start_mask): [(0, 0)]}
+        counter = 0
+        pq = [(0, 0, 0, 0, counter, origin_id, None, None,
+               start_mask)]  # (priority, cost, minutes, minutes bound, tie, current_node, PathNode, current_date, mask)
+        results = []
+        complete_costs = []  # Price objective: the k cheapest complete itinerary costs pushed so far
+        popped = expanded = 0
+        max_heap = 1
+        cost_pruned = visit_pruned = constraint_pruned = dominated_pruned = stale_pruned = 0
+        bound_time = bounds.compute_time + (time_bounds.compute_time if time_bounds else 0.0)
+        now = time.perf_counter()
+        stats.add_time("setup", now - phase_start)
+        phase_start = now
+
+        # The bound is admissible, so complete itineraries come off the heap in order of cost
+        while pq:
+            priority, cost, minutes, minutes_bound, _, current, node, current_date, mask = heapq.heappop(pq)
+            popped += 1
+
+            # Pareto: the latest frontier itinerary is the fastest found; if it is at most as expensive and as slow
+            # as the best this entry could finish at, it beats everything that can grow from the entry
+            if pareto:
+                beaten = results and results[-1][1] <= priority and minutes_bound >= results[-1][2]
+            else:
+                beaten = len(complete_costs) == k and priority > complete_costs[-1]
+            if beaten:
+                cost_pruned += 1
+                if hook is not None:
+                    hook("prune", reason="cost_bound", city=store.airports[current], date=current_date, count=1)
+                continue
+
+            state_labels = labels[(current, current_date, mask)]
+            if pareto:
+                displaced = (cost, minutes) not in state_labels
+            else:
+                displaced = len(state_labels) >= k and cost > state_labels[-1][0]
+            if displaced:
+                # Displaced by labels found after this entry was pushed
+                stale_pruned += 1
+                if hook is not None:
+                    hook("prune", reason="stale", city=store.airports[current], date=current_date, count=1)
+                continue
+
+            expanded += 1
+            if debug:
+                logger.debug(f"Exploring node: {store.airports[current]}, Cost: {cost}, Minutes: {minutes}")
+            if hook is not None:
+                hook("expand", city=store.airports[current], date=current_date, cost=cost, priority=priority)
+
+            if not mask and current == origin_id:
+                path = node.path(store.airports) if node is not None else []
+                logger.info(f"Completed path: {path}, Total cost: {cost}, Flight time: {minutes_to_duration(minutes)}")
+                if pareto and results and results[-1][1] == cost:
+                    results.pop()  # Same price as the previous frontier itinerary but faster
+                results.append((path, cost, minutes))
+                stats.completed += 1
+                if hook is not None:
+                    hook("complete", path=path, cost=cost)
+                if not pareto and len(results) == k:
+                    break
+                continue
+
+            earliest, latest, clip = self._departure_window(current, current_date, stays, blocked)
+            check_departure = current_date is None and current in blocked
+
+            for next_id, route in store.routes_from(current).items():
+                next_code = store.airports[next_id]
+                start, stop = route.window(earliest, latest)
+                outside, clipped = len(route) - (stop - start), 0
+                if clip is not None:
+                    clipped_stop = max(start, route.window(None, clip)[1])
+                    clipped, stop = stop - clipped_stop, clipped_stop
+                visit_pruned += outside
+                constraint_pruned += clipped
+                if hook is not None:
+                    for reason, count in (("visit_length", outside), ("constraint", clipped)):
+                        if count:
+                            hook("prune", reason=reason, city=next_code, date=None, count=count)
+                if start >= stop:
+                    continue
+
+                next_mask = mask & ~(1 << next_id)
+                heuristic_cost = bounds.lower_bound(origin_id, next_id, next_mask)
+                if not pareto and len(complete_costs) == k and (
+                        cost + route.prices[route.cheapest(start, stop)] + heuristic_cost > complete_costs[-1]):
+                    cost_pruned += stop - start
+                    if hook is not None:
+                        hook("prune", reason="cost_bound", city=next_code, date=None, count=stop - start)
+                    continue
+                heuristic_minutes = time_bounds.lower_bound(origin_id, next_id, next_mask) if time_bounds else 0
+                check_arrival = next_id in blocked
+                completes = not next_mask and next_id == origin_id
+                for i in range(start, stop):
+                    leg_ordinal = route.dates[i]
+                    if (check_departure and blocked.is_blocked(current, leg_ordinal)) or (
+                            check_arrival and blocked.is_blocked(next_id, leg_ordinal)):
+                        constraint_pruned += 1
+                        if hook is not None:
+                            hook("prune", reason="constraint", city=next_code, date=leg_ordinal, count=1)
+                        continue
+
+                    next_cost = cost + route.prices[i]
+                    next_minutes = minutes + route.durations[i]
+                    next_priority = next_cost + heuristic_cost
+                    next_minutes_bound = next_minutes + heuristic_minutes
+                    if pareto:
+                        beaten = results and results[-1][1] <= next_priority and next_minutes_bound >= results[-1][2]
+                    else:
+                        beaten = len(complete_costs) == k and next_priority > complete_costs[-1]
+                    if beaten:
+                        cost_pruned += 1
+                        if hook is not None:
+                            hook("prune", reason="cost_bound", city=next_code, date=leg_ordinal, count=1)
+                        continue
+
+                    if not self._add_label(labels, (next_id, leg_ordinal, next_mask), next_cost, next_minutes, k,
+                                           pareto):
+                        dominated_pruned += 1
+                        if hook is not None:
+                            hook("prune", reason="dominated", city=next_code, date=leg_ordinal, count=1)
+                        continue
+                    if completes and not pareto:
+                        insort(complete_costs, next_cost)
+                        del complete_costs[k:]
+
+                    counter += 1
+                    heapq.heappush(pq, (next_priority, next_cost, next_minutes, next_minutes_bound, counter, next_id,
+                                        PathNode(node, next_id, leg_ordinal, route.prices[i]),
+                                        leg_ordinal, next_mask))
+                    max_heap = max(max_heap, len(pq))
+                    if hook is not None:
+                        hook("push", city=next_code, date=leg_ordinal, cost=next_cost, bound=heuristic_cost)
 
-        for start_date, end_date in constraints:
-            if datetime.strptime(start_date, "%Y-%m-%d") <= date <= datetime.strptime(end_date, "%Y-%m-%d"):
-                # print(f"Skipping leg due to date constraint: {date.strftime("%Y-%m-%d")} in {start_date} to {
-                # end_date}")
-                return True
-        return False
+        stats.popped += popped
+        stats.expanded += expanded
+        stats.pushed += counter
+        stats.max_heap = max(stats.max_heap, max_heap)
+        stats.states += len(labels)
+        for reason, count in (("cost_bound", cost_pruned), ("visit_length", visit_pruned),
+                              ("constraint", constraint_pruned), ("dominated", dominated_pruned),
+                              ("stale", stale_pruned)):
+            stats.pruned[reason] += count
+        bound_time = bounds.compute_time + (time_bounds.compute_time if time_bounds else 0.0) - bound_time
+        stats.add_time("bound", bound_time)
+        stats.add_time("search", time.perf_counter() - phase_start - bound_time)
+        if not results:
+            logger.info("No valid path found.")
+        return results
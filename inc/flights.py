@@ -38,8 +38,11 @@ class UserInputFlightsConnector(Connector):
             return None
         return self.parse_price(price_input)
 
-    def match_airline(self, airline_input: str) -> str:
-        """Matches the airline input to the dictionary or suggests the closest match."""
+    def match_airline(self, airline_input: str, interactive: bool = True) -> str:
+        """
+        Matches the airline input to the dictionary or suggests the closest match.
+        :param interactive: Ask whether the closest match was meant; when False (bulk imports) a near miss is an error.
+        """
         airline_input_lower = airline_input.lower()
 
         # Check if input matches abbreviation
@@ -57,6 +60,8 @@ class UserInputFlightsConnector(Connector):
                                                   n=1)
         if closest_match:
             original_name = next(name for name in self.airlines.keys() if name.lower() == closest_match[0])
+            if not interactive:
+                raise ValueError(f"Airline not recognized: '{airline_input}'. Did you mean '{original_name}'?")
             confirmation = input(f"Did you mean '{original_name}'? (y/n): ").strip().lower()
             if confirmation == "y":
                 return original_name
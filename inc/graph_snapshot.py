@@ -0,0 +1,101 @@
+# Python
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, Any, Tuple
+
+from .leg_store import LegStore, RouteLegs
+
+MAGIC = b"FGSNAP01"
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+
+# File layout:
+#   MAGIC | header length (little-endian u64) | JSON header | padding to ALIGNMENT | column blocks
+# Each RouteLegs column is stored as one block holding every route's values back to back, in header route order,
+# followed by blocks for the per-key origin and destination ids. Blocks are native-endian and start on an ALIGNMENT
+# boundary so they can be read straight out of the memory map.
+
+
+def save_snapshot(legs: LegStore, path: str, metadata: Dict[str, Any]):
+    """Writes the leg store and caller metadata (version, cache marker, ...) to path, atomically."""
+    routes = [(origin_id, destination_id, route) for origin_id, by_destination in legs.routes.items()
+              for destination_id, route in by_destination.items() if len(route)]
+    blocks = []
+    for column, typecode in RouteLegs.COLUMNS:
+        block = array(typecode)
+        for _, _, route in routes:
+            block.extend(getattr(route, column))
+        blocks.append((column, block))
+    blocks.append(("key_origins", legs.key_origins))
+    blocks.append(("key_destinations", legs.key_destinations))
+
+    # Offsets are relative to the start of the first block, which itself is aligned after the header
+    layout, offset = {}, 0
+    for name, block in blocks:
+        layout[name] = [block.typecode, offset, len(block)]
+        offset += -(-len(block) * block.itemsize // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({"format": FORMAT_VERSION, "byteorder": sys.byteorder, "metadata": metadata,
+                         "airports": legs.airports, "airlines": legs.airlines, "keys": legs.keys,
+                         "routes": [[origin_id, destination_id, len(route)] for origin_id, destination_id, route in
+                                    routes], "blocks": layout}).encode("utf-8")
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        f.write(b"\0" * (-f.tell() % ALIGNMENT))
+        for _, block in blocks:
+            block.tofile(f)
+            f.write(b"\0" * (-len(block) * block.itemsize % ALIGNMENT))
+    os.replace(temp_path, path)
+
+
+def load_snapshot(path: str) -> Tuple[LegStore, Dict[str, Any]]:
+    """
+    Reads a snapshot written by save_snapshot, returning the leg store and the saved metadata.
+    Raises ValueError if the file is not a snapshot this build can read.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if mapped[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a flight graph snapshot.")
+        (header_length,) = struct.unpack_from("<Q", mapped, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = json.loads(mapped[header_start:header_start + header_length])
+        if header["format"] != FORMAT_VERSION or header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written by an incompatible build.")
+        data_start = header_start + header_length
+        data_start += -data_start % ALIGNMENT
+
+        legs = LegStore()
+        legs.airports = header["airports"]
+        legs.airport_ids = {code: airport_id for airport_id, code in enumerate(legs.airports)}
+        legs.airlines = header["airlines"]
+        legs.airline_ids = {name: airline_id for airline_id, name in enumerate(legs.airlines)}
+        legs.keys = header["keys"]
+        legs._key_ids = None  # Rebuilt on the first update that needs it
+
+        view = memoryview(mapped)
+        try:
+            starts = {name: data_start + offset for name, (_, offset, _) in header["blocks"].items()}
+            for name in ("key_origins", "key_destinations"):
+                column = getattr(legs, name)
+                column.frombytes(view[starts[name]:starts[name] + header["blocks"][name][2] * column.itemsize])
+            position = 0
+            for origin_id, destination_id, count in header["routes"]:
+                route = RouteLegs()
+                for name, _ in RouteLegs.COLUMNS:
+                    column = getattr(route, name)
+                    start = starts[name] + position * column.itemsize
+                    column.frombytes(view[start:start + count * column.itemsize])
+                route.min_price = min(route.prices)
+                legs.routes.setdefault(origin_id, {})[destination_id] = route
+                legs.size += count
+                position += count
+        finally:
+            view.release()
+    return legs, header["metadata"]
@@ -0,0 +1,162 @@
+# Python
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from .blocked_dates import BlockedDates
+from .connection_index import ConnectionIndex
+from .leg_store import ordinal_to_date
+
+# Arrivals at a stop: arrival ordinal (None before the first departure) -> (cost, trail), where a trail is the
+# back-pointer chain (previous trail, airport id, date ordinal, price) of the flights taken, or None at the start
+Arrivals = Dict[int, Tuple[float, tuple]]
+
+
+def _fly(graph, current: int, next_id: int, arrivals: Arrivals, stays: Dict[int, Tuple[int, int]],
+         blocked: BlockedDates, next_arrivals: Arrivals, route=None):
+    """
+    Extends every arrival at current by one flight to next_id, keeping the cheapest per arrival date.
+    :param route: The ConnectionLegs to fly instead of the direct legs.
+    """
+    route = route if route is not None else graph.legs.route(current, next_id)
+    if route is None:
+        return
+    hubs = getattr(route, "hubs", None)
+    check_arrival = next_id in blocked
+    if current not in stays and current not in blocked and None not in arrivals:
+        # Passing through: any flight on or after the arrival date works, so one sweep over both sorted date lists
+        # pairs every flight with the cheapest arrival not after it
+        arrival_dates = sorted(arrivals)
+        best, position = None, 0
+        for i in range(len(route)):
+            leg_ordinal = route.dates[i]
+            while position < len(arrival_dates) and arrival_dates[position] <= leg_ordinal:
+                arrival = arrivals[arrival_dates[position]]
+                if best is None or arrival[0] < best[0]:
+                    best = arrival
+                position += 1
+            if best is None or (check_arrival and blocked.is_blocked(next_id, leg_ordinal)):
+                continue
+            next_cost = best[0] + route.prices[i]
+            if next_cost < next_arrivals.get(leg_ordinal, (float("inf"),))[0]:
+                next_arrivals[leg_ordinal] = (next_cost, (best[1], next_id, leg_ordinal, route.prices[i]))
+        return
+
+    for arrival, (cost, trail) in arrivals.items():
+        earliest, latest, clip = graph._departure_window(current, arrival, stays, blocked)
+        if clip is not None:
+            latest = clip if latest is None else min(latest, clip)
+        check_departure = arrival is None and current in blocked
+        start, stop = route.window(earliest, latest)
+        for i in range(start, stop):
+            leg_ordinal = route.dates[i]
+            arrival = leg_ordinal if hubs is None else route.arrivals[i]
+            if (check_departure and blocked.is_blocked(current, leg_ordinal)) or (
+                    check_arrival and blocked.is_blocked(next_id, arrival)) or (
+                    hubs is not None and blocked.any_blocked(hubs[i], leg_ordinal, arrival)):
+                continue
+            next_cost = cost + route.prices[i]
+            if next_cost < next_arrivals.get(arrival, (float("inf"),))[0]:
+                if hubs is None:
+                    next_arrivals[arrival] = (next_cost, (trail, next_id, leg_ordinal, route.prices[i]))
+                else:
+                    next_arrivals[arrival] = (next_cost, ((trail, hubs[i], leg_ordinal, route.first_prices[i]),
+                                                          next_id, arrival, route.second_prices[i]))
+
+
+def tour_cost(graph, origin_id: int, order: Sequence[int], stays: Dict[int, Tuple[int, int]], blocked: BlockedDates,
+              prefixes: Dict[tuple, Arrivals] = None,
+              connections: ConnectionIndex = None) -> Tuple[List[Tuple[str, str, float]], float]:
+    """
+    Cheapest dated itinerary that visits the destinations in the given order and flies home, under the same
+    visit-length and blocked-date rules as the search. Each hop is a direct flight or one connection through an
+    airport that is not a destination. A small dynamic program over arrival dates: for each stop it keeps the cheapest
+    way of arriving on every date. Returns (None, inf) if the order cannot be flown.
+    :param prefixes: Optional memo of the arrivals after each order prefix, shared between calls on related orders.
+    :param connections: Take the one-stop connections from this index, with its layover rules, instead of pairing
+        legs through any hub.
+    """
+    prefixes = prefixes if prefixes is not None else {}
+    hubs = [airport for airport in range(len(graph.legs.airports)) if airport not in stays and airport != origin_id]
+    stops = (*order, origin_id)
+    arrivals, current = {None: (0.0, None)}, origin_id
+    for position, next_id in enumerate(stops):
+        prefix = stops[:position + 1]
+        next_arrivals = prefixes.get(prefix)
+        if next_arrivals is None:
+            next_arrivals = {}
+            _fly(graph, current, next_id, arrivals, stays, blocked, next_arrivals)
+            if connections is not None:
+                connection_route = connections.route(current, next_id)
+                if connection_route is not None:
+                    _fly(graph, current, next_id, arrivals, stays, blocked, next_arrivals, connection_route)
+            else:
+                for hub in hubs:
+                    if graph.legs.route(hub, next_id) is None:
+                        continue
+                    hub_arrivals = {}
+                    _fly(graph, current, hub, arrivals, stays, blocked, hub_arrivals)
+                    if hub_arrivals:
+                        _fly(graph, hub, next_id, hub_arrivals, stays, blocked, next_arrivals)
+            prefixes[prefix] = next_arrivals
+        if not next_arrivals:
+            return None, float("inf")
+        arrivals, current = next_arrivals, next_id
+
+    cost, trail = min(arrivals.values(), key=lambda arrival: arrival[0])
+    path = []
+    while trail is not None:
+        trail, airport, leg_ordinal, price = trail
+        path.append((graph.legs.airports[airport], ordinal_to_date(leg_ordinal), price))
+    return path[::-1], cost
+
+
+def greedy_tour(graph, origin_id: int, stays: Dict[int, Tuple[int, int]], blocked: BlockedDates,
+                stop_at: float = None,
+                connections: ConnectionIndex = None) -> Tuple[List[Tuple[str, str, float]], float]:
+    """
+    Finds a good feasible itinerary quickly, to seed the search's upper bound. Nearest-neighbour orders on the min-fare
+    matrix, one per choice of first destination, are priced with tour_cost; the cheapest is then improved by moving
+    single destinations to other positions and swapping pairs until no move helps, or until the time.monotonic()
+    deadline stop_at. Returns (None, inf) if none of the orders tried can be flown.
+    :param connections: As for tour_cost.
+    """
+    bounds = graph.fare_bounds()
+    destination_ids = sorted(stays)
+    prefixes = {}
+    best_order, best_path, best_cost = None, None, float("inf")
+    for first in destination_ids:
+        order, remaining = [first], set(destination_ids) - {first}
+        while remaining:
+            closest = min(remaining, key=lambda dest_id: (bounds.fare(order[-1], dest_id), dest_id))
+            order.append(closest)
+            remaining.remove(closest)
+        path, cost = tour_cost(graph, origin_id, order, stays, blocked, prefixes, connections)
+        if cost < best_cost:
+            best_order, best_path, best_cost = order, path, cost
+    if best_order is None:
+        return None, float("inf")
+
+    improved = True
+    while improved:
+        improved = False
+        candidates = []
+        for i in range(len(best_order)):
+            for j in range(len(best_order)):
+                if i == j:
+                    continue
+                moved = best_order[:i] + best_order[i + 1:]
+                moved.insert(j, best_order[i])
+                candidates.append(moved)
+                if i < j:
+                    swapped = best_order[:]
+                    swapped[i], swapped[j] = swapped[j], swapped[i]
+                    candidates.append(swapped)
+        for order in candidates:
+            if stop_at is not None and time.monotonic() >= stop_at:
+                return best_path, best_cost
+            path, cost = tour_cost(graph, origin_id, order, stays, blocked, prefixes, connections)
+            if cost < best_cost:
+                best_order, best_path, best_cost = order, path, cost
+                improved = True
+                break
+    return best_path, best_cost
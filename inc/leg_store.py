@@ -0,0 +1,253 @@
+# Python
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+def date_to_ordinal(date_str: str) -> int:
+    """Converts a YYYY-MM-DD string into a proleptic Gregorian day ordinal."""
+    return date.fromisoformat(date_str).toordinal()
+
+
+def ordinal_to_date(ordinal: int) -> str:
+    """Converts a day ordinal back into a YYYY-MM-DD string."""
+    return date.fromordinal(ordinal).isoformat()
+
+
+def duration_to_minutes(duration: str) -> int:
+    """Parses a duration such as '2:30', '2h 45m' or '1h' into whole minutes."""
+    hh_mm_match = re.match(r"^(\d+):(\d{2})$", duration.strip())
+    if hh_mm_match:
+        return int(hh_mm_match.group(1)) * 60 + int(hh_mm_match.group(2))
+    hours_match = re.search(r"(\d+)\s*h", duration, re.IGNORECASE)
+    minutes_match = re.search(r"(\d+)\s*m", duration, re.IGNORECASE)
+    if not hours_match and not minutes_match:
+        raise ValueError(f"Invalid duration format: {duration}")
+    hours = int(hours_match.group(1)) if hours_match else 0
+    minutes = int(minutes_match.group(1)) if minutes_match else 0
+    return hours * 60 + minutes
+
+
+def minutes_to_duration(minutes: int) -> str:
+    """Formats minutes in the HH:MM style produced by the flights connector."""
+    return f"{minutes // 60}:{minutes % 60:02}"
+
+
+def cheapest_table(prices) -> List[array]:
+    """
+    Sparse table for range-minimum queries over prices: level k holds, for every i, the index of the cheapest price
+    in prices[i:i + 2 ** k]. Takes O(n log n) time and space to build.
+    """
+    levels = [array("i", range(len(prices)))]
+    width = 1
+    while width * 2 <= len(prices):
+        previous = levels[-1]
+        levels.append(array("i", (a if prices[a] <= prices[b] else b for a, b in zip(previous, previous[width:]))))
+        width *= 2
+    return levels
+
+
+class RouteLegs:
+    """All legs between one (origin, destination) pair, stored column-wise and kept sorted by date."""
+    # (attribute, array typecode) for every column, in snapshot order
+    COLUMNS = (("dates", "i"), ("prices", "d"), ("durations", "i"), ("airlines", "i"), ("keys", "i"))
+    __slots__ = ("dates", "prices", "durations", "airlines", "keys", "min_price", "_cheapest")
+
+    def __init__(self):
+        self.dates = array("i")  # Day ordinals, ascending
+        self.prices = array("d")
+        self.durations = array("i")  # Minutes
+        self.airlines = array("i")  # Interned airline ids
+        self.keys = array("i")  # Id of the cache key the leg was loaded from, or -1
+        self.min_price = float("inf")
+        self._cheapest = None  # cheapest_table over prices, built on first use and dropped when the legs change
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def add(self, date_ordinal: int, price: float, duration: int, airline: int, key: int = -1):
+        """Inserts a leg, keeping the columns sorted by date (appends are the common case)."""
+        if not self.dates or self.dates[-1] <= date_ordinal:
+            self.dates.append(date_ordinal)
+            self.prices.append(price)
+            self.durations.append(duration)
+            self.airlines.append(airline)
+            self.keys.append(key)
+        else:
+            index = bisect_right(self.dates, date_ordinal)
+            self.dates.insert(index, date_ordinal)
+            self.prices.insert(index, price)
+            self.durations.insert(index, duration)
+            self.airlines.insert(index, airline)
+            self.keys.insert(index, key)
+        self.min_price = min(self.min_price, price)
+        self._cheapest = None
+
+    def remove(self, index: int):
+        """Removes the leg at the given index."""
+        for column, _ in self.COLUMNS:
+            del getattr(self, column)[index]
+        self.min_price = min(self.prices, default=float("inf"))
+        self._cheapest = None
+
+    def window(self, earliest: int = None, latest: int = None) -> Tuple[int, int]:
+        """Returns the index range of legs departing within [earliest, latest]; None leaves a side open."""
+        start = 0 if earliest is None else bisect_left(self.dates, earliest)
+        stop = len(self.dates) if latest is None else bisect_right(self.dates, latest)
+        return start, stop
+
+    def cheapest(self, start: int, stop: int) -> int:
+        """
+        Returns the index of the cheapest leg in the non-empty index range [start, stop), such as a window(), in
+        constant time from a sparse table built over the route's prices the first time it is needed.
+        """
+        levels = self._cheapest
+        if levels is None:
+            levels = self._cheapest = cheapest_table(self.prices)
+        k = (stop - start).bit_length() - 1
+        a, b = levels[k][start], levels[k][stop - (1 << k)]
+        return a if self.prices[a] <= self.prices[b] else b
+
+
+class LegStore:
+    """Compact leg storage: interned airport and airline ids with per-route, date-sorted columns."""
+
+    def __init__(self):
+        self.airports = []  # Airport id -> code
+        self.airport_ids = {}  # Airport code -> id
+        self.airlines = []  # Airline id -> name
+        self.airline_ids = {}  # Airline name -> id
+        self.routes = {}  # Origin id -> {destination id: RouteLegs}
+        self.size = 0
+        self.keys = []  # Key id -> cache key a leg was loaded from, None once that leg is removed
+        self.key_origins = array("i")  # Key id -> origin id of its leg
+        self.key_destinations = array("i")  # Key id -> destination id of its leg
+        self._key_ids = {}  # Cache key -> key id; None until first needed after loading a snapshot
+
+    def __len__(self) -> int:
+        return self.size
+
+    def intern_airport(self, code: str) -> int:
+        """Returns the id for an airport code, assigning a new one if needed."""
+        airport_id = self.airport_ids.get(code)
+        if airport_id is None:
+            airport_id = len(self.airports)
+            self.airports.append(code)
+            self.airport_ids[code] = airport_id
+        return airport_id
+
+    def intern_airline(self, name: str) -> int:
+        """Returns the id for an airline name, assigning a new one if needed."""
+        airline_id = self.airline_ids.get(name)
+        if airline_id is None:
+            airline_id = len(self.airlines)
+            self.airlines.append(name)
+            self.airline_ids[name] = airline_id
+        return airline_id
+
+    def key_ids(self) -> Dict[str, int]:
+        """Returns the cache key -> key id index, rebuilding it if it was not loaded."""
+        if self._key_ids is None:
+            self._key_ids = {key: key_id for key_id, key in enumerate(self.keys) if key is not None}
+        return self._key_ids
+
+    def add(self, origin: str, destination: str, date_str: str, price: float, duration: str, airline: str,
+            key: str = None):
+        """
+        Adds a leg given in the string form used by the cache.
+        A leg added with a cache key replaces any earlier leg loaded from the same key.
+        """
+        origin_id = self.intern_airport(origin)
+        destination_id = self.intern_airport(destination)
+        key_id = -1
+        if key is not None:
+            self.remove_key(key)
+            key_id = len(self.keys)
+            self.keys.append(key)
+            self.key_origins.append(origin_id)
+            self.key_destinations.append(destination_id)
+            self.key_ids()[key] = key_id
+        route = self.routes.setdefault(origin_id, {}).get(destination_id)
+        if route is None:
+            route = self.routes[origin_id][destination_id] = RouteLegs()
+        route.add(date_to_ordinal(date_str), price, duration_to_minutes(duration), self.intern_airline(airline),
+                  key_id)
+        self.size += 1
+
+    def key_leg(self, key: str) -> Optional[Tuple[int, int, int, float]]:
+        """Returns (origin id, destination id, date ordinal, price) of the leg loaded from a cache key, or None."""
+        key_id = self.key_ids().get(key)
+        if key_id is None:
+            return None
+        origin_id, destination_id = self.key_origins[key_id], self.key_destinations[key_id]
+        route = self.routes[origin_id][destination_id]
+        index = route.keys.index(key_id)
+        return origin_id, destination_id, route.dates[index], route.prices[index]
+
+    def holds(self, key: str, origin: str, destination: str, date_str: str, price: float, duration: str,
+              airline: str) -> bool:
+        """Returns True if the leg loaded from a cache key is exactly the given leg."""
+        key_id = self.key_ids().get(key)
+        if key_id is None:
+            return False
+        origin_id, destination_id = self.key_origins[key_id], self.key_destinations[key_id]
+        if (origin_id, destination_id) != (self.airport_ids.get(origin), self.airport_ids.get(destination)):
+            return False
+        route = self.routes[origin_id][destination_id]
+        index = route.keys.index(key_id)
+        return (route.dates[index] == date_to_ordinal(date_str) and route.prices[index] == price
+                and route.durations[index] == duration_to_minutes(duration)
+                and self.airlines[route.airlines[index]] == airline)
+
+    def compact_keys(self):
+        """Renumbers the key ids so the slots of removed legs are dropped."""
+        if None not in self.keys:
+            return
+        renumbered = array("i", [-1] * len(self.keys))
+        keys, key_origins, key_destinations = [], array("i"), array("i")
+        for key_id, key in enumerate(self.keys):
+            if key is not None:
+                renumbered[key_id] = len(keys)
+                keys.append(key)
+                key_origins.append(self.key_origins[key_id])
+                key_destinations.append(self.key_destinations[key_id])
+        for by_destination in self.routes.values():
+            for route in by_destination.values():
+                route.keys = array("i", (key_id if key_id < 0 else renumbered[key_id] for key_id in route.keys))
+        self.keys, self.key_origins, self.key_destinations = keys, key_origins, key_destinations
+        self._key_ids = None
+
+    def remove_key(self, key: str) -> bool:
+        """Removes the leg loaded from a cache key. Returns False if there is no such leg."""
+        key_id = self.key_ids().pop(key, None)
+        if key_id is None:
+            return False
+        origin_id, destination_id = self.key_origins[key_id], self.key_destinations[key_id]
+        route = self.routes[origin_id][destination_id]
+        route.remove(route.keys.index(key_id))
+        if not route:
+            del self.routes[origin_id][destination_id]
+        self.keys[key_id] = None
+        self.size -= 1
+        return True
+
+    def routes_from(self, origin_id: int) -> Dict[int, RouteLegs]:
+        """Returns the routes leaving an airport, keyed by destination id."""
+        return self.routes.get(origin_id, {})
+
+    def route(self, origin_id: int, destination_id: int) -> RouteLegs:
+        """Returns the legs between two airports, or None if there are none."""
+        return self.routes.get(origin_id, {}).get(destination_id)
+
+    def iter_legs(self, origin: str) -> Iterator[Dict]:
+        """Yields the legs out of an airport as dictionaries, grouped by destination and sorted by date."""
+        origin_id = self.airport_ids.get(origin)
+        if origin_id is None:
+            return
+        for destination_id, route in self.routes_from(origin_id).items():
+            for i in range(len(route)):
+                yield {"destination": self.airports[destination_id], "date": ordinal_to_date(route.dates[i]),
+                       "price": route.prices[i], "duration": minutes_to_duration(route.durations[i]),
+                       "airline": self.airlines[route.airlines[i]]}
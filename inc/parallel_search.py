@@ -0,0 +1,88 @@
+# Python
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+from .blocked_dates import BlockedDates
+from .greedy_tour import greedy_tour
+from .search_stats import SearchStats
+
+# Per-process state installed by _init_worker; the graph is inherited or unpickled once per worker, not per task
+_worker_graph = None
+_worker_best = None
+
+
+def _init_worker(graph, shared_best):
+    global _worker_graph, _worker_best
+    _worker_graph = graph
+    _worker_best = shared_best
+
+
+def _search_partition(origin: str, destinations: Dict[str, Tuple[int, int]],
+                      constraints: Dict[str, List[Tuple[str, str]]], dedupe_states: bool, bound: str, stop_at: float,
+                      max_expansions: int, first_legs: set) -> Tuple[List[Tuple[str, str, float]], float, SearchStats]:
+    stats = SearchStats()
+    path, cost = _worker_graph._find_least_cost_path(origin, destinations, constraints, dedupe_states, bound, stats,
+                                                     None, False, stop_at, max_expansions, first_legs, _worker_best)
+    return path, cost, stats
+
+
+def partition_first_legs(graph, origin: str, bound: str) -> List[set]:
+    """
+    Splits the search space by the first airport flown to: one set of (airport id, date ordinal) first legs per
+    airport, most promising (cheapest way out plus the bound from there) first so good itineraries, and with them a
+    tight shared cost bound, turn up early.
+    """
+    store = graph.legs
+    origin_id = store.airport_ids.get(origin)
+    if origin_id is None:
+        return []
+    partitions = []
+    for next_id, route in store.routes_from(origin_id).items():
+        estimate = route.min_price
+        if bound == "mst":
+            # Only a sort key, so the full remaining-destination mask is not needed here
+            estimate += graph.fare_bounds().fare(next_id, origin_id)
+        partitions.append((estimate, {(next_id, leg_date) for leg_date in route.dates}))
+    partitions.sort(key=lambda partition: partition[0])
+    return [first_legs for _, first_legs in partitions]
+
+
+def parallel_least_cost_path(graph, origin: str, destinations: Dict[str, Tuple[int, int]],
+                             constraints: Dict[str, List[Tuple[str, str]]], dedupe_states: bool, bound: str,
+                             stats: SearchStats, workers: int, seed: bool, stop_at: float,
+                             max_expansions: int) -> Tuple[List[Tuple[str, str, float]], float]:
+    """
+    Runs find_least_cost_path across a process pool, one task per first airport. Workers publish every improving
+    itinerary to a shared best cost and prune against it, so a cheap route found by one worker cuts the others' search
+    short. With seed set, the greedy itinerary is computed here first and its cost is the shared bound's starting
+    value. The partitions cover every itinerary, so the optimum is the same as the serial search's.
+    Workers are started by a fork server rather than forked from a caller that may be running threads (the cache
+    compaction thread, search_many), so scripts using this need the usual if __name__ == "__main__" guard.
+    """
+    partitions = partition_first_legs(graph, origin, bound)
+    best_path, best_cost = None, float("inf")
+    store = graph.legs
+    destination_ids = [store.airport_ids.get(dest) for dest in destinations]
+    if not partitions or None in destination_ids:
+        return best_path, best_cost
+    if seed:
+        seed_start = time.perf_counter()
+        stays = {store.airport_ids[dest]: days for dest, days in destinations.items()}
+        best_path, best_cost = greedy_tour(graph, store.airport_ids[origin], stays,
+                                           BlockedDates(constraints, store.airport_ids), stop_at)
+        stats.add_time("seed", time.perf_counter() - seed_start)
+    context = multiprocessing.get_context("forkserver")
+    shared_best = context.Value("d", best_cost)
+    with ProcessPoolExecutor(max_workers=min(workers, len(partitions)), mp_context=context, initializer=_init_worker,
+                             initargs=(graph, shared_best)) as executor:
+        futures = [executor.submit(_search_partition, origin, destinations, constraints, dedupe_states, bound,
+                                   stop_at, max_expansions, first_legs) for first_legs in partitions]
+        for future in futures:
+            path, cost, worker_stats = future.result()
+            stats.merge(worker_stats)
+            if path is not None and cost < best_cost:
+                best_path, best_cost = path, cost
+    stats.record_bounds(best_cost, best_cost, False)
+    return best_path, best_cost
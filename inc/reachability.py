@@ -0,0 +1,92 @@
+# Python
+from typing import Dict, Tuple
+
+from .blocked_dates import BlockedDates
+from .leg_store import LegStore
+
+
+class Reachability:
+    """
+    Which search states can still finish a trip, from one pass backwards over the calendar starting at the legs that
+    return to the origin.
+
+    For every airport and day the pass finds the most destination stops that can still be made after arriving there
+    that day and get home, under the same stay windows and blocked dates as the search. Landing at any destination
+    counts as a stop, visited before or not, so this only overestimates: a state with more destinations left to visit
+    than that cannot finish, and neither can a departure after the last day from which enough stops remain.
+    :param limit: Number of destinations in the trip; counts are capped there.
+    """
+
+    def __init__(self, legs: LegStore, origin: int, stays: Dict[int, Tuple[int, int]], blocked: BlockedDates,
+                 limit: int):
+        airports = range(len(legs.airports))
+        arrivals = {}  # Day ordinal -> {airport id: [airport ids with a leg to it that day]}
+        for source, by_destination in legs.routes.items():
+            for destination, route in by_destination.items():
+                for day in set(route.dates):
+                    arrivals.setdefault(day, {}).setdefault(destination, []).append(source)
+        self.first = min(arrivals, default=0)
+        span = max(arrivals, default=-1) - self.first + 1
+        # Airport id -> per day: the most stops left after arriving that day (-1 if home cannot be reached), and the
+        # most stops left after departing that day
+        self.stops = {airport: [-1] * span for airport in airports}
+        departs = {airport: [-1] * span for airport in airports}
+
+        for i in range(span - 1, -1, -1):
+            day = self.first + i
+            for airport in airports:
+                if blocked.is_blocked(airport, day):
+                    continue
+                if airport in stays:
+                    # Stay for the visit length, ending before the next blocked day
+                    min_days, max_days = stays[airport]
+                    last = min(i + max_days, span - 1)
+                    next_blocked = blocked.next_blocked(airport, day + 1)
+                    if next_blocked is not None:
+                        last = min(last, next_blocked - 1 - self.first)
+                    window = departs[airport][i + min_days:last + 1]
+                    self.stops[airport][i] = max(window, default=-1)
+                else:
+                    # Wait here for a later day, unless that day is blocked
+                    later = self.stops[airport][i + 1] if i + 1 < span else -1
+                    self.stops[airport][i] = max(later, 0) if airport == origin else later
+
+            # Flights landing today reach their destination's stops the same day; spread them back to the airports
+            # they leave from until nothing improves
+            landings = arrivals.get(day, {})
+            pending = [airport for airport in landings if self.stops[airport][i] >= 0]
+            while pending:
+                airport = pending.pop()
+                value = min(limit, self.stops[airport][i] + (airport in stays))
+                for source in landings.get(airport, ()):
+                    if value <= departs[source][i] or blocked.is_blocked(source, day):
+                        continue
+                    departs[source][i] = value
+                    if source in stays and stays[source][0]:
+                        continue  # Only reachable from earlier arrivals, which are processed later
+                    if value > self.stops[source][i]:
+                        self.stops[source][i] = value
+                        pending.append(source)
+
+        # Airport id -> per number of stops left, the last day a departure can still make them
+        self.latest = {}
+        for airport in airports:
+            latest = [self.first - 1] * (limit + 1)
+            for i in range(span - 1, -1, -1):
+                for needed in range(departs[airport][i] + 1):
+                    if latest[needed] < self.first:
+                        latest[needed] = self.first + i
+            self.latest[airport] = latest
+
+    def completable(self, airport: int, day: int, remaining: int) -> bool:
+        """Returns True unless arriving at the airport on the day leaves no way to visit remaining destinations."""
+        stops = self.stops[airport]
+        i = day - self.first
+        return 0 <= i < len(stops) and stops[i] >= remaining
+
+    def latest_departure(self, airport: int, remaining: int) -> int:
+        """
+        Returns the last day to leave the airport with remaining destinations still to visit and get home; a day
+        before every leg if there is none.
+        """
+        return self.latest[airport][remaining]
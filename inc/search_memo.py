@@ -0,0 +1,164 @@
+# Python
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .blocked_dates import BlockedDates
+from .fare_bounds import FareBounds
+from .leg_store import date_to_ordinal
+
+# A leg as the memo tracks it: (origin id, destination id, date ordinal, price)
+Leg = Tuple[int, int, int, float]
+
+# Looks up the cheapest way to finish a trip from (airport id, arrival ordinal, remaining mask): (cost, path) or None
+SuffixLookup = Callable[[int, int, int], Optional[Tuple[float, List[Tuple[str, str, float]]]]]
+
+
+class MemoEntry:
+    """A proven cheapest way to finish a trip from an airport, with what is needed to recheck it after changes."""
+    __slots__ = ("cost", "path", "start", "origin", "mask", "legs", "version")
+
+    def __init__(self, cost: float, path: List[Tuple[str, str, float]], start: int, origin: int, mask: int,
+                 legs: frozenset, version: int):
+        self.cost = cost  # inf, with path None, when there is no way
+        self.path = path
+        self.start = start  # Airport id the path leaves from
+        self.origin = origin  # Airport id the trip ends at
+        self.mask = mask  # Destinations the path still has to visit
+        self.legs = legs  # Legs flown, as Leg tuples
+        self.version = version  # Graph version the entry is known to hold at
+
+
+class SearchMemo:
+    """
+    Solved least-cost queries, and the optimal suffix tours found along the way, kept across searches on one graph.
+
+    A suffix tour is the cheapest way to finish a trip from a (destination, arrival date, remaining destinations)
+    state. It does not depend on how the state was reached, so a later search for the same trip, such as the one that
+    re-solves it after a fare change, completes the state with it instead of searching on from it. Stays apply to
+    every destination flown through, visited or not, so the trip here is the origin, every destination's stay, the
+    date constraints and the routing.
+
+    Entries are not dropped wholesale when fares change. Every added or removed leg is logged, and an entry is checked
+    against the changes made since it was last known to hold the first time it is read. It still holds unless
+    - a removed leg is one it flies, since removing any other leg only takes away alternatives; or
+    - an added leg could be part of something cheaper. Any way through the leg flies to it visiting some of the
+      remaining destinations and home from it visiting the others; if the leg plus the fare_bounds lower bounds of
+      the two halves, for the cheapest split, is not below the entry's cost, the leg cannot improve on it.
+    :param max_changes: Changes kept in the log; entries older than the log are dropped.
+    """
+
+    def __init__(self, graph, max_changes: int = 1024):
+        self.graph = graph
+        self.max_changes = max_changes
+        self.results = {}  # Query key -> MemoEntry
+        self.suffixes = {}  # (query key, airport id, arrival ordinal, remaining mask) -> MemoEntry
+        self.changes = []  # (graph version after the change, added, Leg), oldest first
+        self.horizon = graph.version  # Entries known to hold at this version or later can be checked against the log
+
+    def record_change(self, added: bool, leg: Leg):
+        """Logs a leg the graph just added or removed."""
+        self.changes.append((self.graph.version, added, leg))
+        if len(self.changes) > self.max_changes:
+            dropped = len(self.changes) - self.max_changes
+            self.horizon = self.changes[dropped - 1][0]
+            del self.changes[:dropped]
+
+    @staticmethod
+    def _through(bounds: FareBounds, entry: MemoEntry, leg: Leg) -> float:
+        """Lower bound on finishing the entry's trip with a route that flies the given leg."""
+        leg_origin, leg_destination, _, price = leg
+        best = float("inf")
+        before = entry.mask
+        while True:
+            # Visit the destinations in before on the way to the leg, and the rest after it
+            best = min(best, bounds.lower_bound(leg_origin, entry.start, before) +
+                       bounds.lower_bound(entry.origin, leg_destination, entry.mask & ~before))
+            if not before:
+                break
+            before = (before - 1) & entry.mask
+        return price + best
+
+    def _holds(self, entry: MemoEntry) -> bool:
+        """Checks an entry against the changes since it was last known to hold, and brings it up to date if so."""
+        if entry.version == self.graph.version:
+            return True
+        if entry.version < self.horizon:
+            return False
+        bounds = self.graph.fare_bounds()
+        for changed, added, leg in reversed(self.changes):
+            if changed <= entry.version:
+                break
+            if added:
+                if self._through(bounds, entry, leg) < entry.cost:
+                    return False
+            elif leg in entry.legs:
+                return False
+        entry.version = self.graph.version
+        return True
+
+    def _get(self, table: Dict[Any, MemoEntry], key: Any) -> Optional[MemoEntry]:
+        entry = table.get(key)
+        if entry is not None and not self._holds(entry):
+            del table[key]
+            entry = None
+        return entry
+
+    def _entry(self, cost: float, path: List[Tuple[str, str, float]], start: int, origin: int,
+               mask: int) -> MemoEntry:
+        airport_ids = self.graph.legs.airport_ids
+        legs, current = [], start
+        for code, date, price in path or ():
+            next_id = airport_ids[code]
+            legs.append((current, next_id, date_to_ordinal(date), price))
+            current = next_id
+        return MemoEntry(cost, path, start, origin, mask, frozenset(legs), self.graph.version)
+
+    def query_key(self, origin: str, destinations: Dict[str, Tuple[int, int]],
+                  constraints: Dict[str, List[Tuple[str, str]]], routing: Any) -> tuple:
+        """
+        Normalizes a query: the origin, the stays by destination, the blocked dates as one bitset per airport (so
+        equivalent range lists match) and the routing rules.
+        """
+        stays = tuple(sorted((dest, tuple(days)) for dest, days in destinations.items()))
+        blocked = BlockedDates(constraints, self.graph.legs.airport_ids)
+        return origin, stays, tuple(sorted(blocked.blocked.items())), routing
+
+    def result(self, key: tuple) -> Optional[Tuple[List[Tuple[str, str, float]], float]]:
+        """Returns the stored (path, cost) for a query key if it still holds, or None."""
+        entry = self._get(self.results, key)
+        if entry is None:
+            return None
+        return (list(entry.path) if entry.path is not None else None), entry.cost
+
+    def store(self, key: tuple, destinations: Dict[str, Tuple[int, int]], path: List[Tuple[str, str, float]],
+              cost: float, suffixes: bool = True):
+        """
+        Stores a proven least-cost answer to a query and, with suffixes, the suffix tour from every destination the
+        path stops at. Only pass answers from searches that ran to completion.
+        """
+        airport_ids = self.graph.legs.airport_ids
+        origin_id = airport_ids.get(key[0])
+        destination_ids = {airport_ids.get(dest) for dest in destinations}
+        if origin_id is None or None in destination_ids:
+            return
+        mask = 0
+        for dest_id in destination_ids:
+            mask |= 1 << dest_id
+        self.results[key] = self._entry(cost, path, origin_id, origin_id, mask)
+        if path is None or not suffixes:
+            return
+        for i, (code, date, _) in enumerate(path[:-1]):
+            airport = airport_ids[code]
+            mask &= ~(1 << airport)
+            if airport in destination_ids:
+                suffix = path[i + 1:]
+                self.suffixes[(key, airport, date_to_ordinal(date), mask)] = self._entry(
+                    sum(price for _, _, price in suffix), suffix, airport, origin_id, mask)
+
+    def suffix_lookup(self, key: tuple) -> SuffixLookup:
+        """Returns the lookup a search for the query key uses for the suffix tours stored for it."""
+
+        def lookup(airport: int, arrival: int, mask: int):
+            entry = self._get(self.suffixes, (key, airport, arrival, mask))
+            return None if entry is None else (entry.cost, entry.path)
+
+        return lookup
@@ -0,0 +1,87 @@
+# Python
+import io
+from typing import Dict, Any
+
+# Why a leg or frontier entry was discarded
+PRUNE_REASONS = (
+    "cost_bound",  # Cost so far plus the lower bound could not beat the best complete itinerary
+    "visit_length",  # Departure falls outside the stay window of the city being left
+    "constraint",  # Stay or arrival would overlap a blocked date range
+    "dominated",  # The same (city, date, remaining destinations) state was already reached at no greater cost
+    "stale",  # Popped entry was superseded by a cheaper push of the same state
+    "unreachable",  # Not enough of the calendar is left to visit the remaining destinations and get home
+)
+
+
+class SearchStats:
+    """Counters and phase timings collected by one FlightGraph search."""
+
+    def __init__(self):
+        self.popped = 0  # Entries taken off the frontier
+        self.expanded = 0  # Popped entries whose outgoing legs were examined
+        self.pushed = 0
+        self.max_heap = 0
+        self.states = 0  # Distinct states recorded by state de-duplication
+        self.completed = 0  # Complete itineraries that improved the best cost
+        self.memo_hits = 0  # Queries answered, and states completed, from the graph's search memo
+        self.pruned = {reason: 0 for reason in PRUNE_REASONS}
+        self.phase_times = {}  # Phase name -> seconds
+        self.profile = None  # pstats.Stats when the search ran with profile=True
+        self.lower_bound = None  # Proven lower bound on the optimal cost
+        self.upper_bound = None  # Cost of the itinerary returned
+        self.stopped_early = False  # A deadline or expansion budget ended the search
+
+    def add_time(self, phase: str, seconds: float):
+        self.phase_times[phase] = self.phase_times.get(phase, 0.0) + seconds
+
+    def record_bounds(self, lower_bound: float, upper_bound: float, stopped_early: bool):
+        """Records one search's (or one parallel worker's) bounds, keeping the tightest over everything recorded."""
+        self.lower_bound = lower_bound if self.lower_bound is None else min(self.lower_bound, lower_bound)
+        self.upper_bound = upper_bound if self.upper_bound is None else min(self.upper_bound, upper_bound)
+        self.stopped_early = self.stopped_early or stopped_early
+
+    @property
+    def gap(self) -> float:
+        """
+        Relative optimality gap of the returned itinerary, (cost - lower bound) / cost: 0 once it is proven optimal,
+        None before any search or when no itinerary was found.
+        """
+        if self.upper_bound is None or self.upper_bound == float("inf"):
+            return None
+        if not self.upper_bound:
+            return 0.0
+        return max(0.0, (self.upper_bound - self.lower_bound) / self.upper_bound)
+
+    def merge(self, other: "SearchStats"):
+        """Adds the counters and timings of another search, such as one parallel worker's share, into these."""
+        self.popped += other.popped
+        self.expanded += other.expanded
+        self.pushed += other.pushed
+        self.max_heap = max(self.max_heap, other.max_heap)
+        self.states += other.states
+        self.completed += other.completed
+        self.memo_hits += other.memo_hits
+        for reason, count in other.pruned.items():
+            self.pruned[reason] += count
+        for phase, seconds in other.phase_times.items():
+            self.add_time(phase, seconds)
+        if other.lower_bound is not None:
+            self.record_bounds(other.lower_bound, other.upper_bound, other.stopped_early)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"popped": self.popped, "expanded": self.expanded, "pushed": self.pushed, "max_heap": self.max_heap,
+                "states": self.states, "completed": self.completed, "memo_hits": self.memo_hits,
+                "pruned": dict(self.pruned), "phase_times": dict(self.phase_times), "lower_bound": self.lower_bound,
+                "upper_bound": self.upper_bound, "gap": self.gap, "stopped_early": self.stopped_early}
+
+    def profile_report(self, limit: int = 25, sort: str = "cumulative") -> str:
+        """Returns the top entries of the cProfile output, or an empty string if the search was not profiled."""
+        if self.profile is None:
+            return ""
+        stream = io.StringIO()
+        self.profile.stream = stream
+        self.profile.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def __repr__(self) -> str:
+        return f"SearchStats({self.as_dict()})"
@@ -0,0 +1,79 @@
+# Python
+import random
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+from .flight_graph import FlightGraph
+
+
+def airport_codes(count: int) -> List[str]:
+    """Returns count distinct three-letter codes: AAA, AAB, ..."""
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return [letters[i // 676 % 26] + letters[i // 26 % 26] + letters[i % 26] for i in range(count)]
+
+
+def generate_network(airports: int = 20, days: int = 60, route_density: float = 0.5, daily_density: float = 0.6,
+                     price_distribution: str = "lognormal", mean_price: float = 250.0, price_spread: float = 0.35,
+                     start_date: str = "2025-01-01", seed: int = 0) -> FlightGraph:
+    """
+    Builds a deterministic synthetic fare network.
+    :param airports: Number of airports.
+    :param days: Length of the fare calendar in days.
+    :param route_density: Probability that a directed airport pair has any service.
+    :param daily_density: Probability that a served route has a fare on a given day.
+    :param price_distribution: "lognormal" (route base prices skewed towards cheap, with occasional expensive
+        routes) or "uniform" (base prices spread evenly around the mean).
+    :param mean_price: Typical route base price.
+    :param price_spread: Relative day-to-day variation of a route's fare around its base price.
+    :param seed: Seed for the random generator; the same arguments always give the same network.
+    """
+    if price_distribution not in ("lognormal", "uniform"):
+        raise ValueError(f"Unknown price distribution '{price_distribution}'.")
+    rng = random.Random(seed)
+    codes = airport_codes(airports)
+    first_day = date.fromisoformat(start_date)
+    dates = [(first_day + timedelta(days=day)).isoformat() for day in range(days)]
+    graph = FlightGraph("./cache")
+    for origin in codes:
+        for destination in codes:
+            if origin == destination or rng.random() >= route_density:
+                continue
+            if price_distribution == "lognormal":
+                base_price = rng.lognormvariate(0, 0.5) * mean_price
+            else:
+                base_price = rng.uniform(0.4, 1.6) * mean_price
+            duration = f"{rng.randint(1, 12)}:{rng.choice(['00', '15', '30', '45'])}"
+            for leg_date in dates:
+                if rng.random() < daily_density:
+                    price = round(max(20.0, base_price * (1 + rng.uniform(-price_spread, price_spread))), 2)
+                    graph.add_leg(origin, destination, leg_date, price, duration, "Delta")
+    return graph
+
+
+def generate_query(graph: FlightGraph, destinations: int = 4, min_stay: Tuple[int, int] = (2, 3),
+                   stay_slack: Tuple[int, int] = (1, 3), constraint_density: float = 0.0,
+                   seed: int = 0) -> Tuple[str, Dict[str, Tuple[int, int]], Dict[str, List[Tuple[str, str]]]]:
+    """
+    Picks a deterministic (origin, destinations, constraints) query over a generated network.
+    :param destinations: Number of destinations to visit.
+    :param min_stay: Range the minimum stay of each destination is drawn from.
+    :param stay_slack: Range of extra days added on top of the minimum stay to get the maximum stay.
+    :param constraint_density: Probability that each destination gets a blocked date range of one to three days.
+    """
+    rng = random.Random(seed)
+    codes = sorted(graph.legs.airport_ids)
+    origin, *chosen = rng.sample(codes, destinations + 1)
+    stays = {}
+    for code in chosen:
+        minimum = rng.randint(*min_stay)
+        stays[code] = (minimum, minimum + rng.randint(*stay_slack))
+
+    dates = sorted({leg["date"] for leg in graph.get_legs(origin)})
+    constraints = {}
+    if dates:
+        for code in chosen:
+            if rng.random() < constraint_density:
+                start = date.fromisoformat(rng.choice(dates))
+                end = start + timedelta(days=rng.randint(0, 2))
+                constraints[code] = [(start.isoformat(), end.isoformat())]
+    return origin, stays, constraints
@@ -0,0 +1,45 @@
+# Python
+import argparse
+
+from inc.cache_backends import create_backend
+from travel_search import ConfigLoader
+
+
+def migrate(source_config, target_config, batch_size: int = 1000) -> int:
+    """Copies every entry, timestamps included, from one cache backend to another. Returns the number copied."""
+    source = create_backend(source_config)
+    target = create_backend(target_config)
+    copied = 0
+    batch = []
+    for entry in source.scan():
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            target.set_many(batch)
+            copied += len(batch)
+            batch = []
+    if batch:
+        target.set_many(batch)
+        copied += len(batch)
+    source.close()
+    target.close()
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy the fare cache between storage backends.")
+    parser.add_argument("--from", dest="source", choices=["json", "sqlite"], default="json",
+                        help="Backend to read from (default: json)")
+    parser.add_argument("--to", dest="target", choices=["json", "sqlite"], default="sqlite",
+                        help="Backend to write to (default: sqlite)")
+    args = parser.parse_args()
+    if args.source == args.target:
+        parser.error("Source and target backends must differ.")
+
+    config = ConfigLoader.load_config()
+    copied = migrate({**config, "cache_backend": args.source}, {**config, "cache_backend": args.target})
+    print(f"Copied {copied} cache entries from {args.source} to {args.target}.")
+    print(f"Set cache_backend: \"{args.target}\" in {ConfigLoader.CONFIG_FILE} to use the migrated cache.")
+
+
+if __name__ == "__main__":
+    main()
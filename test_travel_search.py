@@ -1,8 +1,25 @@
 #!/usr/bin/env python3
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
 import yaml
 from unittest.mock import patch
 from travel_search import CacheManager, UserInputFlightsConnector, TravelSearch
+from inc.batch_queries import load_queries, run_batch
+from inc.blocked_dates import BlockedDates
+from inc.connector import Connector
+from inc.fare_import import import_fares
+from inc.flight_graph import FlightGraph, PathNode
+from inc.greedy_tour import greedy_tour, tour_cost
+from inc.leg_store import date_to_ordinal
+from inc.reachability import Reachability
+from inc.search_stats import SearchStats
+from inc.synthetic_network import generate_network, generate_query
+from benchmark import compare, run_case
+from migrate_cache import migrate
 
 
 class TestCacheManager(unittest.TestCase):
@@ -17,6 +34,146 @@ class TestCacheManager(unittest.TestCase):
         self.assertEqual(result, {"data": "test"})
 
 
+class TestCacheBackends(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.config = {"cache_dir": self.temp_dir.name, "cache_timeout": 10, "cache_backend": "sqlite",
+                       "cache_db": os.path.join(self.temp_dir.name, "cache.sqlite3")}
+        self.fares = [(f"{origin}_{destination}_{date}_flight_money", 100.0,
+                       {"origin": origin, "destination": destination, "date": date, "price": 120.0,
+                        "duration": "2:00", "airline": "Alaska"})
+                      for origin, destination, date in [("PDX", "LAX", "2025-12-01"), ("PDX", "LAX", "2025-12-05"),
+                                                        ("PDX", "SFO", "2025-12-02"), ("LAX", "PDX", "2025-12-03")]]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_sqlite_get_set_scan(self):
+        cache_manager = CacheManager(self.config)
+        cache_manager.set_cache("test_key", {"data": "test"})
+        self.assertEqual(cache_manager.get_cache("test_key"), {"data": "test"})
+        cache_manager.backend.set_many(self.fares)
+        scanned = [key for key, _, _ in cache_manager.scan("PDX", "LAX", "2025-12-01", "2025-12-04")]
+        self.assertEqual(scanned, ["PDX_LAX_2025-12-01_flight_money"])
+        self.assertEqual(len(list(cache_manager.scan(origin="PDX"))), 3)
+        self.assertEqual(set(cache_manager.expired_keys()), {key for key, _, _ in self.fares})
+
+    def test_memory_tier_lru_and_counters(self):
+        cache_manager = CacheManager({**self.config, "cache_memory_entries": 2})
+        for key, _, result in self.fares[:3]:
+            cache_manager.set_cache(key, result)
+        self.assertEqual(list(cache_manager.memory), [self.fares[1][0], self.fares[2][0]])
+        self.assertEqual(cache_manager.get_cache(self.fares[2][0]), self.fares[2][2])
+        self.assertEqual(cache_manager.get_cache(self.fares[0][0]), self.fares[0][2])  # Miss, served from storage
+        self.assertEqual(list(cache_manager.memory), [self.fares[2][0], self.fares[0][0]])
+        self.assertEqual(cache_manager.stats()["hits"], 1)
+        self.assertEqual(cache_manager.stats()["misses"], 1)
+
+    def test_compact_purges_expired_entries(self):
+        cache_manager = CacheManager(self.config)
+        cache_manager.backend.set_many(self.fares)  # Timestamps far in the past
+        cache_manager.set_cache("fresh_key", {"data": "fresh"})
+        self.assertEqual(cache_manager.compact(), len(self.fares))
+        self.assertEqual([key for key, _, _ in cache_manager.scan()], ["fresh_key"])
+        self.assertEqual(cache_manager.get_cache("fresh_key"), {"data": "fresh"})
+
+    def test_migrate_json_to_sqlite(self):
+        json_config = {**self.config, "cache_backend": "json"}
+        CacheManager(json_config).backend.set_many(self.fares)
+        self.assertEqual(migrate(json_config, self.config), len(self.fares))
+        migrated = sorted(CacheManager(self.config).scan())
+        self.assertEqual(migrated, sorted(self.fares))
+
+    def test_import_fares(self):
+        cache_manager = CacheManager(self.config)
+        csv_path = os.path.join(self.temp_dir.name, "fares.csv")
+        with open(csv_path, "w") as f:
+            f.write("origin,destination,date,price,duration,airline\n"
+                    "pdx,lax,2025-12-01,$120,2h 15m,AS\n"
+                    "PDX,SFO,2025-12-02,99.50,,delta\n"
+                    "PDX,SFO,12/02/2025,99.50,1:30,Delta\n")
+        jsonl_path = os.path.join(self.temp_dir.name, "fares.jsonl")
+        with open(jsonl_path, "w") as f:
+            f.write('{"origin": "LAX", "destination": "PDX", "date": "2025-12-03", "price": 80, "airline": "Deltaa"}\n'
+                    '{"origin": "LAX", "destination": "PDX", "date": "2025-12-04", "price": 80}\n'
+                    "not json\n")
+        batches = []
+        connector = UserInputFlightsConnector({"airlines": {"Alaska": "AS", "Delta": "DL"}})
+        report = import_fares(cache_manager, connector, [csv_path, jsonl_path], batch_size=2,
+                              progress=lambda report: batches.append(report["rows"]))
+        self.assertEqual((report["rows"], report["written"], report["rejected"]), (6, 3, 3))
+        self.assertEqual(batches, [2, 6])
+        self.assertTrue(report["errors"][0].startswith(f"{csv_path}:4: "))
+        self.assertIn("Did you mean 'Delta'?", report["errors"][1])
+        self.assertEqual(cache_manager.get_cache("PDX_LAX_2025-12-01_flight_money"),
+                         {"origin": "PDX", "destination": "LAX", "date": "2025-12-01", "price": 120.0,
+                          "duration": "2:15", "airline": "Alaska"})
+        self.assertEqual(cache_manager.get_cache("PDX_SFO_2025-12-02_flight_money")["airline"], "Delta")
+        self.assertEqual(cache_manager.get_cache("LAX_PDX_2025-12-04_flight_money")["duration"], "1:00")
+
+
+class TestGraphSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.snapshot = os.path.join(self.temp_dir.name, "graph.snapshot")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def fare(self, origin, destination, date, price):
+        return f"{origin}_{destination}_{date}_flight_money", {"origin": origin, "destination": destination,
+                                                               "date": date, "price": price, "duration": "2:00",
+                                                               "airline": "Alaska"}
+
+    def check_incremental_sync(self, backend):
+        config = {"cache_dir": self.temp_dir.name, "cache_timeout": 10, "cache_backend": backend}
+        cache_manager = CacheManager(config)
+        for origin, destination, date, price in [("PDX", "LAX", "2025-12-01", 100.0),
+                                                 ("LAX", "PDX", "2025-12-04", 90.0),
+                                                 ("PDX", "SFO", "2025-12-01", 120.0)]:
+            cache_manager.set_cache(*self.fare(origin, destination, date, price))
+        graph = FlightGraph.from_cache(cache_manager, self.snapshot)
+        self.assertEqual(len(graph.legs), 3)
+
+        # Changes after the snapshot: one new fare, one repriced fare and one removed fare
+        cache_manager.set_cache(*self.fare("SFO", "PDX", "2025-12-05", 70.0))
+        cache_manager.set_cache(*self.fare("PDX", "LAX", "2025-12-01", 80.0))
+        cache_manager.backend.delete(self.fare("LAX", "PDX", "2025-12-04", 0)[0])
+
+        loaded = FlightGraph.load_snapshot(self.snapshot, self.temp_dir.name)
+        self.assertEqual(loaded.get_legs("PDX"), graph.get_legs("PDX"))
+        self.assertEqual(loaded.sync_cache(cache_manager), 3)
+        self.assertEqual(loaded.sync_cache(cache_manager), 0)  # Same-tick re-reads are skipped
+        self.assertEqual(sorted((leg["destination"], leg["price"]) for leg in loaded.get_legs("PDX")),
+                         [("LAX", 80.0), ("SFO", 120.0)])
+        self.assertEqual(loaded.get_legs("LAX"), [])
+        self.assertEqual(len(loaded.get_legs("SFO")), 1)
+
+    def test_incremental_sync_sqlite(self):
+        self.check_incremental_sync("sqlite")
+
+    def test_incremental_sync_json(self):
+        self.check_incremental_sync("json")
+
+    def test_unchanged_cache_settles(self):
+        cache_manager = CacheManager({"cache_dir": self.temp_dir.name, "cache_timeout": 10, "cache_backend": "json"})
+        for origin, destination, date, price in [("PDX", "LAX", "2025-12-01", 100.0),
+                                                 ("LAX", "PDX", "2025-12-04", 90.0)]:
+            cache_manager.set_cache(*self.fare(origin, destination, date, price))
+        FlightGraph.from_cache(cache_manager, self.snapshot)
+        cache_manager.set_cache(*self.fare("PDX", "LAX", "2025-12-01", 80.0))
+        graph = FlightGraph.from_cache(cache_manager, self.snapshot)
+        modified = os.stat(self.snapshot).st_mtime_ns
+        for _ in range(3):
+            restarted = FlightGraph.from_cache(cache_manager, self.snapshot)
+            self.assertEqual(restarted.version, graph.version)
+        self.assertEqual(os.stat(self.snapshot).st_mtime_ns, modified)
+        self.assertEqual(sorted(restarted.legs.keys), sorted(key for key, _, _ in cache_manager.scan()))
+        self.assertEqual(restarted.legs.key_leg(self.fare("PDX", "LAX", "2025-12-01", 0)[0])[3], 80.0)
+
+
 class TestUserInputFlightsConnector(unittest.TestCase):
 
     def setUp(self):
@@ -74,6 +231,57 @@ class TestScraper(unittest.TestCase):
         self.assertEqual(result, {"data": "cached"})
 
 
+class StubConnector(Connector):
+    """Local connector that simulates network latency and records how many lookups overlap."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def get_details(self, origin, destination, date, transportation_mode, payment_type):
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+        return {"origin": origin, "destination": destination, "date": date, "price": 100.0}
+
+
+class TestSearchMany(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.travel_search = TravelSearch({"cache_dir": self.temp_dir.name, "cache_timeout": 10})
+        self.connector = StubConnector(latency=0.05)
+        self.travel_search.register_connector("stub", self.connector, max_concurrency=3)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_concurrent_lookups_respect_limit(self):
+        lookups = [("stub", "PDX", "LAX", f"2025-12-{day:02}", "flight", "money") for day in range(1, 10)]
+        start = time.perf_counter()
+        results = dict(self.travel_search.search_many(lookups))
+        elapsed = time.perf_counter() - start
+        self.assertEqual(set(results), set(lookups))
+        self.assertEqual(results[lookups[4]]["date"], "2025-12-05")
+        self.assertEqual(self.connector.peak, 3)
+        self.assertLess(elapsed, 9 * self.connector.latency)
+
+    def test_duplicate_lookups_are_coalesced(self):
+        lookup = ("stub", "PDX", "LAX", "2025-12-01", "flight", "money")
+        results = list(self.travel_search.search_many([lookup] * 4 + [lookup[:3] + ("2025-12-02",) + lookup[4:]]))
+        self.assertEqual(len(results), 5)
+        self.assertEqual(self.connector.calls, 2)
+        list(self.travel_search.search_many([lookup]))  # Served from the cache
+        self.assertEqual(self.connector.calls, 2)
+
+
 class TestConfigFile(unittest.TestCase):
 
     def setUp(self):
@@ -97,5 +305,329 @@ class TestConfigFile(unittest.TestCase):
         self.assertIsInstance(self.config['connectors'], dict, "Connectors should be a dictionary.")
 
 
+class TestFlightGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = FlightGraph("./test_cache")
+        # Two orderings (PDX-LAX-SFO and PDX-SFO-LAX) reach the same states on the way back to PDX
+        for origin, destination, date, price in [("PDX", "LAX", "2025-12-01", 100), ("PDX", "SFO", "2025-12-01", 120),
+                                                 ("LAX", "SFO", "2025-12-03", 80), ("SFO", "LAX", "2025-12-03", 50),
+                                                 ("LAX", "PDX", "2025-12-05", 90), ("SFO", "PDX", "2025-12-05", 70),
+                                                 ("LAX", "PDX", "2025-12-06", 60), ("SFO", "PDX", "2025-12-06", 200)]:
+            self.graph.add_leg(origin, destination, date, price, "2:00", "Alaska")
+        self.destinations = {"LAX": (2, 3), "SFO": (2, 3)}
+
+    def test_get_legs_sorted_by_date(self):
+        self.graph.add_leg("PDX", "LAX", "2025-11-30", 150, "2h 15m", "Delta")
+        legs = [leg for leg in self.graph.get_legs("PDX") if leg["destination"] == "LAX"]
+        self.assertEqual([leg["date"] for leg in legs], ["2025-11-30", "2025-12-01"])
+        self.assertEqual(legs[0], {"destination": "LAX", "date": "2025-11-30", "price": 150, "duration": "2:15",
+                                   "airline": "Delta"})
+        self.assertEqual(self.graph.get_legs("BRU"), [])
+
+    def test_cheapest_leg_in_window(self):
+        for date, price in [("2025-12-02", 95), ("2025-12-03", 140), ("2025-12-04", 80), ("2025-12-05", 110)]:
+            self.graph.add_leg("PDX", "LAX", date, price, "2:00", "Alaska", key=f"PDX_LAX_{date}")
+        route = self.graph.legs.route(self.graph.legs.airport_ids["PDX"], self.graph.legs.airport_ids["LAX"])
+        start, stop = route.window(date_to_ordinal("2025-12-01"), date_to_ordinal("2025-12-03"))
+        self.assertEqual(route.prices[route.cheapest(start, stop)], 95)
+        self.assertEqual(route.prices[route.cheapest(0, len(route))], 80)
+        # The table is rebuilt after the legs change
+        self.graph.remove_leg("PDX_LAX_2025-12-04")
+        self.graph.add_leg("PDX", "LAX", "2025-12-03", 60, "2:00", "Alaska")
+        self.assertEqual(route.prices[route.cheapest(*route.window(None, date_to_ordinal("2025-12-02")))], 95)
+        self.assertEqual(route.prices[route.cheapest(0, len(route))], 60)
+
+    def test_least_cost_path(self):
+        path, cost = self.graph.find_least_cost_path("PDX", self.destinations, {})
+        self.assertEqual(cost, 230)
+        self.assertEqual(path, [("SFO", "2025-12-01", 120), ("LAX", "2025-12-03", 50), ("PDX", "2025-12-06", 60)])
+
+    def test_path_nodes(self):
+        airports = ["PDX", "LAX", "SFO"]
+        first = PathNode(None, 2, date_to_ordinal("2025-12-01"), 120)
+        # Two itineraries extending the same first flight share its node
+        to_lax = PathNode(first, 1, date_to_ordinal("2025-12-03"), 50)
+        home = PathNode(first, 0, date_to_ordinal("2025-12-04"), 70)
+        self.assertEqual(to_lax.path(airports), [("SFO", "2025-12-01", 120), ("LAX", "2025-12-03", 50)])
+        self.assertEqual(home.path(airports), [("SFO", "2025-12-01", 120), ("PDX", "2025-12-04", 70)])
+        self.assertIs(to_lax.parent, home.parent)
+
+    def test_search_memo(self):
+        path, cost = self.graph.find_least_cost_path("PDX", self.destinations, {}, memo=True)
+        self.assertEqual(cost, 230)
+        # The same query, with its destinations in another order, is answered without searching
+        stats = SearchStats()
+        self.assertEqual(self.graph.find_least_cost_path("PDX", {"SFO": (2, 3), "LAX": (2, 3)}, {}, stats=stats,
+                                                         memo=True), (path, cost))
+        self.assertEqual((stats.expanded, stats.memo_hits), (0, 1))
+        # Neither a fare too dear to matter nor removing a leg the answer does not fly invalidates it
+        self.graph.add_leg("LAX", "SFO", "2025-12-03", 500, "2:00", "Alaska")
+        self.graph.add_leg("PDX", "LAX", "2025-12-01", 150, "2:00", "Alaska", key="unused")
+        self.graph.remove_leg("unused")
+        self.graph.find_least_cost_path("PDX", self.destinations, {}, stats=stats, memo=True)
+        self.assertEqual((stats.expanded, stats.memo_hits), (0, 2))
+        # A cheaper way home does, and so does removing a leg the answer flies
+        self.graph.add_leg("LAX", "PDX", "2025-12-06", 20, "2:00", "Alaska", key="cheap")
+        self.assertEqual(self.graph.find_least_cost_path("PDX", self.destinations, {}, memo=True)[1], 190)
+        self.assertGreater(self.graph.search_stats.expanded, 0)
+        self.graph.remove_leg("cheap")
+        self.assertEqual(self.graph.find_least_cost_path("PDX", self.destinations, {}, memo=True)[1], 230)
+        self.assertGreater(self.graph.search_stats.expanded, 0)
+
+    def test_dedupe_states_matches_full_search(self):
+        _, deduped_cost = self.graph.find_least_cost_path("PDX", self.destinations, {})
+        deduped_expanded = self.graph.search_stats.expanded
+        _, full_cost = self.graph.find_least_cost_path("PDX", self.destinations, {}, dedupe_states=False)
+        self.assertEqual(deduped_cost, full_cost)
+        self.assertLessEqual(deduped_expanded, self.graph.search_stats.expanded)
+
+    def test_mst_bound_is_admissible(self):
+        ids = self.graph.legs.airport_ids
+        remaining = 1 << ids["LAX"] | 1 << ids["SFO"]
+        # Cheapest way out (100) + spanning tree over LAX/SFO (50) + cheapest way home (60)
+        self.assertEqual(self.graph.fare_bounds().lower_bound(ids["PDX"], ids["PDX"], remaining), 210)
+        _, legacy_cost = self.graph.find_least_cost_path("PDX", self.destinations, {}, bound="legacy")
+        _, mst_cost = self.graph.find_least_cost_path("PDX", self.destinations, {})
+        self.assertEqual(mst_cost, legacy_cost)
+
+    def test_search_stats_and_hook(self):
+        events = []
+        stats = SearchStats()
+        # Blocking LAX on 12-04 leaves no way home after SFO first; blocking PDX on 12-05 drops single return legs
+        constraints = {"LAX": [("2025-12-04", "2025-12-04")], "PDX": [("2025-12-05", "2025-12-05")]}
+        self.graph.find_least_cost_path("PDX", self.destinations, constraints, stats=stats,
+                                        hook=lambda event, **details: events.append((event, details)))
+        self.assertIs(self.graph.search_stats, stats)
+        self.assertEqual(stats.expanded, sum(1 for event, _ in events if event == "expand"))
+        self.assertEqual(stats.pushed, sum(1 for event, _ in events if event == "push"))
+        for reason, count in stats.pruned.items():
+            self.assertEqual(count, sum(details["count"] for event, details in events
+                                        if event == "prune" and details["reason"] == reason))
+        self.assertGreater(stats.pruned["constraint"], 0)
+        self.assertGreater(stats.pruned["visit_length"], 0)
+        self.assertGreater(stats.pruned["unreachable"], 0)
+        self.assertEqual(stats.completed, sum(1 for event, _ in events if event == "complete"))
+        self.assertIn("search", stats.phase_times)
+
+    def test_profile_mode(self):
+        with self.assertLogs("inc.flight_graph", level="INFO") as logs:
+            _, cost = self.graph.find_least_cost_path("PDX", self.destinations, {}, profile=True)
+        self.assertEqual(cost, 230)
+        self.assertIn("_find_least_cost_path", self.graph.search_stats.profile_report())
+        self.assertTrue(any("Starting A* search" in line for line in logs.output))
+
+    def test_parallel_search_matches_serial(self):
+        constraints = {"LAX": [("2025-12-04", "2025-12-04")]}
+        for search_constraints, expected in [({}, 230), (constraints, 250)]:
+            path, cost = self.graph.find_least_cost_path("PDX", self.destinations, search_constraints, workers=2)
+            self.assertEqual(cost, expected)
+            self.assertEqual(path, self.graph.find_least_cost_path("PDX", self.destinations, search_constraints)[0])
+        with self.assertRaises(ValueError):
+            self.graph.find_least_cost_path("PDX", self.destinations, {}, workers=2, hook=lambda event, **details: None)
+
+    def test_greedy_seed(self):
+        ids = self.graph.legs.airport_ids
+        stays = {ids[dest]: days for dest, days in self.destinations.items()}
+        blocked = BlockedDates({}, ids)
+        # Visiting LAX first can only be flown for 250; the improvement step finds the SFO-first order
+        self.assertEqual(tour_cost(self.graph, ids["PDX"], [ids["LAX"], ids["SFO"]], stays, blocked)[1], 250)
+        path, cost = greedy_tour(self.graph, ids["PDX"], stays, blocked)
+        self.assertEqual(cost, 230)
+        self.assertEqual(path, [("SFO", "2025-12-01", 120), ("LAX", "2025-12-03", 50), ("PDX", "2025-12-06", 60)])
+        self.assertEqual(self.graph.find_least_cost_path("PDX", self.destinations, {}, seed=False)[1], 230)
+
+    def test_search_budget(self):
+        self.assertEqual(self.graph.find_least_cost_path("PDX", self.destinations, {}, seed=False, max_expansions=1),
+                         (None, float("inf")))
+        stats = self.graph.search_stats
+        self.assertTrue(stats.stopped_early)
+        self.assertLessEqual(stats.lower_bound, 230)
+        self.assertIsNone(stats.gap)
+        # With the greedy seed as upper bound, expanding the root is enough to prove it optimal
+        self.assertEqual(self.graph.find_least_cost_path("PDX", self.destinations, {}, max_expansions=1)[1], 230)
+        self.assertFalse(self.graph.search_stats.stopped_early)
+        self.assertEqual(self.graph.search_stats.gap, 0)
+        _, cost = self.graph.find_least_cost_path("PDX", self.destinations, {}, deadline=0)
+        self.assertEqual(cost, 230)
+        self.assertTrue(self.graph.search_stats.stopped_early)
+        self.assertAlmostEqual(self.graph.search_stats.gap, (230 - 210) / 230)  # Root bound from the MST tables
+
+    def test_k_cheapest_itineraries(self):
+        itineraries = self.graph.find_itineraries("PDX", self.destinations, {}, k=3)
+        self.assertEqual([cost for _, cost, _ in itineraries], [230, 250, 260])
+        self.assertEqual(itineraries[0][0], self.graph.find_least_cost_path("PDX", self.destinations, {})[0])
+        # Asking for more than exist returns all four itineraries
+        self.assertEqual(len(self.graph.find_itineraries("PDX", self.destinations, {}, k=10)), 4)
+
+    def test_pareto_itineraries(self):
+        # A pricier but much faster way out to SFO; every other leg takes 2:00
+        self.graph.add_leg("PDX", "SFO", "2025-12-01", 130, "0:30", "Alaska")
+        itineraries = self.graph.find_itineraries("PDX", self.destinations, {}, objective="pareto")
+        self.assertEqual([(cost, minutes) for _, cost, minutes in itineraries], [(230, 360), (240, 270)])
+        self.assertEqual(itineraries[1][0][0], ("SFO", "2025-12-01", 130))
+
+    def test_batch_queries(self):
+        queries = [{"id": "free", "origin": "pdx", "destinations": {"LAX": [2, 3], "SFO": [2, 3]}},
+                   {"origin": "PDX", "destinations": {"LAX": [2, 3], "SFO": [2, 3]},
+                    "constraints": {"LAX": [["2025-12-04", "2025-12-04"]]}, "options": {"alternatives": 2}},
+                   {"origin": "PDX", "destinations": {"LAX": [3, 2]}}]
+        with tempfile.TemporaryDirectory() as directory:
+            batch_path = os.path.join(directory, "batch.jsonl")
+            with open(batch_path, "w") as f:
+                f.write("\n".join(json.dumps(query) for query in queries) + "\n\nnot json\n")
+            yaml_path = os.path.join(directory, "trip.yaml")
+            with open(yaml_path, "w") as f:
+                yaml.safe_dump({"origin": "PDX", "destinations": {"SFO": [2, 3]}}, f)
+            results = list(run_batch(self.graph, load_queries([batch_path, yaml_path])))
+            # The process pool gives the same answers, in query order
+            # The workers' copy of the graph would otherwise answer from the memo the serial run filled
+            parallel = list(run_batch(self.graph, load_queries([yaml_path, batch_path]), {"memo": False}, workers=2))
+        self.assertEqual([result["id"] for result in results],
+                         ["free", f"{batch_path}:2", f"{batch_path}:3", f"{batch_path}:5", yaml_path])
+        self.assertEqual(results[0]["cost"], 230)
+        self.assertEqual(results[0]["path"][0], {"location": "SFO", "date": "2025-12-01", "cost": 120})
+        self.assertEqual([itinerary["cost"] for itinerary in results[1]["itineraries"]], [250, 380])
+        self.assertIn("Minimum days", results[2]["error"])
+        self.assertIn("error", results[3])
+        self.assertEqual(results[4]["cost"], 230)  # SFO and home via a connection in LAX
+        for result in results + parallel:
+            result.get("stats", {}).pop("wall_time", None)
+        self.assertEqual(parallel, results[4:] + results[:4])
+
+    def test_batch_queries_stream_with_workers(self):
+        read = []
+
+        def documents():
+            for number in range(20):
+                read.append(number)
+                yield f"q{number}", json.dumps({"origin": "PDX", "destinations": {"SFO": [2, 3]}}), "json"
+
+        results = run_batch(self.graph, documents(), workers=2)
+        self.assertEqual(next(results)["id"], "q0")
+        self.assertLessEqual(len(read), 4)  # Two queries per worker in flight, not the whole input
+        self.assertEqual([result["id"] for result in results], [f"q{number}" for number in range(1, 20)])
+
+    def test_connection_routing(self):
+        for origin, destination, date, price, duration in [("PDX", "FRA", "2025-12-01", 500, "10:00"),
+                                                           ("FRA", "BRU", "2025-12-01", 80, "1:00"),
+                                                           ("FRA", "BRU", "2025-12-02", 60, "1:00"),
+                                                           ("BRU", "PDX", "2025-12-05", 600, "11:00")]:
+            self.graph.add_leg(origin, destination, date, price, duration, "Delta")
+        path, cost = self.graph.find_least_cost_path("PDX", {"BRU": (2, 3)}, {}, routing="connections")
+        self.assertEqual(cost, 1160)
+        self.assertEqual(path, [("FRA", "2025-12-01", 500), ("BRU", "2025-12-02", 60), ("PDX", "2025-12-05", 600)])
+        self.assertEqual(self.graph.find_least_cost_path("PDX", {"BRU": (2, 3)}, {})[1], 1160)
+        # Overnight layovers off, and too tight a same-day connection with a long minimum connection time
+        self.graph.connection_index(min_connection_minutes=60, max_layover_days=0)
+        self.assertEqual(self.graph.find_least_cost_path("PDX", {"BRU": (2, 4)}, {}, routing="connections")[1], 1180)
+        self.graph.connection_index(min_connection_minutes=800)
+        self.assertIsNone(self.graph.find_least_cost_path("PDX", {"BRU": (2, 4)}, {}, routing="connections")[0])
+        # A leg added later is connected without rebuilding the index, and removing it drops the connection again
+        index = self.graph.connection_index()
+        self.graph.add_leg("FRA", "BRU", "2025-12-01", 70, "0:30", "Delta", key="late_fare")
+        self.assertIs(self.graph.connection_index(), index)
+        self.assertEqual(self.graph.find_least_cost_path("PDX", {"BRU": (2, 4)}, {}, routing="connections")[1], 1170)
+        self.graph.remove_leg("late_fare")
+        self.assertIsNone(self.graph.find_least_cost_path("PDX", {"BRU": (2, 4)}, {}, routing="connections")[0])
+        # The hub's own blocked dates apply to the layover
+        self.graph.connection_index(min_connection_minutes=60, max_layover_days=1)
+        blocked_hub = {"FRA": [("2025-12-02", "2025-12-02")]}
+        self.assertEqual(self.graph.find_least_cost_path("PDX", {"BRU": (2, 4)}, blocked_hub,
+                                                         routing="connections")[1], 1180)
+
+    def test_find_by_start_date(self):
+        self.graph.add_leg("PDX", "LAX", "2025-12-02", 90, "2:00", "Alaska")
+        self.graph.add_leg("LAX", "SFO", "2025-12-04", 40, "2:00", "Alaska")
+        by_start_date = self.graph.find_by_start_date("PDX", self.destinations, {}, "2025-11-30", "2025-12-03")
+        self.assertEqual(by_start_date, {
+            "2025-11-30": (None, float("inf")),
+            "2025-12-01": ([("SFO", "2025-12-01", 120), ("LAX", "2025-12-03", 50), ("PDX", "2025-12-06", 60)], 230),
+            "2025-12-02": ([("LAX", "2025-12-02", 90), ("SFO", "2025-12-04", 40), ("PDX", "2025-12-06", 200)], 330),
+            "2025-12-03": (None, float("inf"))})
+        best = self.graph.find_by_start_date("PDX", self.destinations, {}, "2025-11-30", "2025-12-03", best_only=True)
+        self.assertEqual(best, {"2025-12-01": by_start_date["2025-12-01"]})
+        blocked = self.graph.find_by_start_date("PDX", self.destinations, {"SFO": [("2025-12-05", "2025-12-05")]},
+                                                "2025-12-01", "2025-12-02")
+        self.assertEqual(blocked["2025-12-01"][1], 230)
+        self.assertIsNone(blocked["2025-12-02"][0])
+        # Batch queries with a date_range get the same answers
+        document = ("range", json.dumps({"origin": "PDX", "destinations": {"LAX": [2, 3], "SFO": [2, 3]},
+                                         "date_range": {"start": "2025-12-01", "end": "2025-12-02"}}), "json")
+        result = next(run_batch(self.graph, [document]))
+        self.assertEqual({date: found["cost"] for date, found in result["by_start_date"].items()},
+                         {"2025-12-01": 230, "2025-12-02": 330})
+
+    def test_date_constraints(self):
+        constraints = {"LAX": [("2025-12-06", "2025-12-06")]}
+        path, cost = self.graph.find_least_cost_path("PDX", self.destinations, constraints)
+        self.assertEqual(cost, 250)
+        self.assertEqual(path[-1], ("PDX", "2025-12-05", 70))
+
+    def test_date_constraint_inside_stay(self):
+        # Neither the arrival nor the departure of the cheapest LAX stay (12-03 to 12-06) is blocked, but 12-04 is
+        path, cost = self.graph.find_least_cost_path("PDX", self.destinations, {"LAX": [("2025-12-04", "2025-12-04")]})
+        self.assertEqual(cost, 250)
+        self.assertEqual(path, [("LAX", "2025-12-01", 100), ("SFO", "2025-12-03", 80), ("PDX", "2025-12-05", 70)])
+
+    def test_blocked_dates_index(self):
+        blocked = BlockedDates({"LAX": [("2025-12-10", "2025-12-12"), ("2025-12-04", "2025-12-04")]}, {"LAX": 0})
+        day = date_to_ordinal("2025-12-01")
+        self.assertFalse(blocked.is_blocked(0, day))
+        self.assertTrue(blocked.is_blocked(0, day + 3))
+        self.assertEqual(blocked.next_blocked(0, day), day + 3)
+        self.assertEqual(blocked.next_blocked(0, day + 4), day + 9)
+        self.assertIsNone(blocked.next_blocked(0, day + 12))
+        self.assertNotIn(1, blocked)
+
+    def test_reachability(self):
+        store = self.graph.legs
+        ids = store.airport_ids
+        stays = {ids[dest]: days for dest, days in self.destinations.items()}
+        day = date_to_ordinal("2025-12-01")
+        reach = Reachability(store, ids["PDX"], stays, BlockedDates({}, ids), len(stays))
+        # Landing in SFO on 12-01 leaves time for LAX and home; landing on 12-05 leaves no time to stay
+        self.assertTrue(reach.completable(ids["SFO"], day, 1))
+        self.assertTrue(reach.completable(ids["LAX"], day + 2, 0))
+        self.assertFalse(reach.completable(ids["LAX"], day + 2, 1))
+        self.assertFalse(reach.completable(ids["SFO"], day + 4, 0))
+        self.assertEqual(reach.latest_departure(ids["PDX"], 2), day)
+        self.assertEqual(reach.latest_departure(ids["LAX"], 1), day + 2)
+        self.assertEqual(reach.latest_departure(ids["LAX"], 0), day + 5)
+        # Blocking LAX on 12-04 cuts the stay there after SFO, but not the one before it
+        reach = Reachability(store, ids["PDX"], stays, BlockedDates({"LAX": [("2025-12-04", "2025-12-04")]}, ids),
+                             len(stays))
+        self.assertFalse(reach.completable(ids["SFO"], day, 1))
+        self.assertTrue(reach.completable(ids["LAX"], day, 1))
+        self.assertEqual(reach.latest_departure(ids["PDX"], 2), day)
+
+
+class TestSyntheticNetwork(unittest.TestCase):
+
+    def test_generator_is_deterministic(self):
+        first = generate_network(airports=6, days=10, seed=3)
+        second = generate_network(airports=6, days=10, seed=3)
+        self.assertEqual(len(first.legs), len(second.legs))
+        self.assertEqual(first.get_legs("AAA"), second.get_legs("AAA"))
+        self.assertNotEqual(first.get_legs("AAA"), generate_network(airports=6, days=10, seed=4).get_legs("AAA"))
+        self.assertEqual(generate_query(first, destinations=3, seed=1), generate_query(second, destinations=3, seed=1))
+
+    def test_legacy_search_leaves_memo_alone(self):
+        graph = generate_network(airports=8, days=20, seed=5)
+        query = generate_query(graph, destinations=3, seed=5)
+        _, optimum = graph.find_least_cost_path(*query)
+        # The legacy heuristic is inadmissible, so its answer must not be kept as a proven optimum
+        graph.find_least_cost_path(*query, bound="legacy", memo=True)
+        self.assertEqual(graph.find_least_cost_path(*query, memo=True)[1], optimum)
+        self.assertEqual(graph.search_stats.memo_hits, 0)
+
+    def test_benchmark_case_metrics(self):
+        result = run_case(airports=6, days=20, destinations=2, constraint_density=0.5, seed=0)
+        for metric in ("wall_time", "peak_memory", "expanded", "pushed", "max_heap", "cost"):
+            self.assertIn(metric, result)
+        self.assertGreater(result["expanded"], 0)
+        self.assertEqual(compare({"results": [result]}, {"results": [result]})[0].count("x1.00"), 4)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,16 +1,21 @@
 # Python
+import argparse
 import json
-import os
-from typing import Dict, Any
+import logging
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterable, Iterator, Tuple
 import yaml
+from inc.batch_queries import load_queries, run_batch
 from inc.flight_graph import FlightGraph
+from inc.leg_store import minutes_to_duration
 from inc.flights import UserInputFlightsConnector
 from inc.connector import Connector
 from inc.cache_manager import CacheManager
 
 
 # TODO: What about intermediate stops? What if I want to fly into frankfurt and then take a train to ghent?
-#   I want to be able to route through hubs without having to specify a stop.
 # TODO: What about rental cars
 # TODO: How to account for overnight travel?
 # TODO: How to account for multiple legs of a journey on the same day?
@@ -31,16 +36,25 @@ class TravelSearch:
     def __init__(self, config: Dict[str, Any]):
         self.connectors = {}
         self.cache_manager = CacheManager(config)
+        self.default_concurrency = config.get("connector_concurrency", 4)
+        self.connector_limits = {}  # Connector name -> maximum concurrent lookups
+        self.connector_slots = {}  # Connector name -> semaphore enforcing that limit
+        self.in_flight = {}  # Cache key -> Future for lookups currently waiting on a connector
+        self.in_flight_lock = threading.Lock()
 
-    def register_connector(self, name: str, connector: Connector):
+    def register_connector(self, name: str, connector: Connector, max_concurrency: int = None):
         self.connectors[name] = connector
+        self.connector_limits[name] = max_concurrency or self.default_concurrency
+        self.connector_slots[name] = threading.BoundedSemaphore(self.connector_limits[name])
+
+    @staticmethod
+    def cache_key(connector_name: str, origin: str, destination: str, date: str, transportation_mode: str,
+                  payment_type: str) -> str:
+        return f"{connector_name}_{origin}_{destination}_{date}_{transportation_mode}_{payment_type}"
 
     def search(self, connector_name: str, origin: str, destination: str, date: str, transportation_mode: str,
                payment_type: str, force_refresh: bool = False) -> Dict[str, Any]:
-        # Output cache for debugging
-        self.cache_manager.output_cache()
-
-        cache_key = f"{connector_name}_{origin}_{destination}_{date}_{transportation_mode}_{payment_type}"
+        cache_key = self.cache_key(connector_name, origin, destination, date, transportation_mode, payment_type)
         if not force_refresh:
             cached_result = self.cache_manager.get_cache(cache_key)
             if cached_result:
@@ -49,71 +63,187 @@ class TravelSearch:
         if connector_name not in self.connectors:
             raise ValueError(f"Connector '{connector_name}' not found.")
 
-        connector = self.connectors[connector_name]
-        result = connector.get_details(origin, destination, date, transportation_mode, payment_type)
-        self.cache_manager.set_cache(cache_key, result)
-        return result
+        # Coalesce with an identical lookup that is already waiting on the connector
+        with self.in_flight_lock:
+            future = self.in_flight.get(cache_key)
+            owner = future is None
+            if owner:
+                future = self.in_flight[cache_key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            connector = self.connectors[connector_name]
+            with self.connector_slots[connector_name]:
+                result = connector.get_details(origin, destination, date, transportation_mode, payment_type)
+            self.cache_manager.set_cache(cache_key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.in_flight_lock:
+                del self.in_flight[cache_key]
+
+    def search_many(self, lookups: Iterable[Tuple[str, str, str, str, str, str]], force_refresh: bool = False,
+                    max_workers: int = None) -> Iterator[Tuple[Tuple[str, str, str, str, str, str], Dict[str, Any]]]:
+        """
+        Runs many lookups concurrently on a thread pool and yields (lookup, result) pairs as they complete.
+        :param lookups: (connector_name, origin, destination, date, transportation_mode, payment_type) tuples.
+        :param force_refresh: Skip the cache and always ask the connector.
+        :param max_workers: Pool size; defaults to the sum of the concurrency limits of the connectors involved.
+        Each connector still runs at most its own concurrency limit at once, and duplicate lookups in the batch or
+        already in flight from another caller share one connector call. A failed lookup raises when it is reached.
+        """
+        batch = {}  # Cache key -> lookups that share it
+        for lookup in lookups:
+            batch.setdefault(self.cache_key(*lookup), []).append(tuple(lookup))
+        if not batch:
+            return
+        if max_workers is None:
+            connector_names = {shared[0][0] for shared in batch.values()}
+            max_workers = sum(self.connector_limits.get(name, 1) for name in connector_names)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.search, *shared[0], force_refresh=force_refresh): shared
+                       for shared in batch.values()}
+            for future in as_completed(futures):
+                result = future.result()
+                for lookup in futures[future]:
+                    yield lookup, result
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the cheapest round trip through a set of destinations.")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Search log verbosity; DEBUG logs every expanded node")
+    parser.add_argument("--profile", action="store_true", help="Profile the search and print search statistics")
+    parser.add_argument("--dump-cache", action="store_true", help="Print every cache entry before searching")
+    parser.add_argument("--alternatives", type=int, default=1, metavar="K",
+                        help="Show the K cheapest itineraries instead of only the cheapest")
+    parser.add_argument("--pareto", action="store_true",
+                        help="Show every itinerary not beaten on both price and total flight time")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes for the cheapest-itinerary search")
+    parser.add_argument("--deadline", type=float, metavar="SECONDS",
+                        help="Stop the cheapest-itinerary search after this long and show the best itinerary so far")
+    parser.add_argument("--routing", default="legs", choices=["legs", "connections"],
+                        help="'connections' moves only between your stops, over direct flights and precomputed "
+                             "one-stop connections, which is much faster but skips routes needing two hubs in a row")
+    parser.add_argument("--start-dates", nargs=2, metavar=("FIRST", "LAST"),
+                        help="Find the cheapest itinerary for every first departure date from FIRST to LAST "
+                             "(YYYY-MM-DD) in one search")
+    parser.add_argument("--best-start-date", action="store_true",
+                        help="With --start-dates, only show the cheapest start date")
+    parser.add_argument("--queries", nargs="+", metavar="PATH",
+                        help="Answer query files (YAML, or JSONL with one query per line; '-' reads JSONL from stdin) "
+                             "instead of prompting, writing one JSON result per line")
+    parser.add_argument("--output", metavar="PATH", help="Write --queries results here instead of standard output")
+    parser.add_argument("--batch-workers", type=int, default=1, metavar="N",
+                        help="Worker processes answering --queries in parallel")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format="%(message)s")
+
     # Load configuration
     config = ConfigLoader.load_config()
     flights_connector = UserInputFlightsConnector(config)
 
-    # Initialize FlightGraph
-    flight_graph = FlightGraph(config["cache_dir"])
-
     # Output cache for debugging
     cache_manager = CacheManager(config)
-    # cache_manager.output_cache()
-
-    # Load cached journey legs into the graph
-    for cache_file in os.listdir(config["cache_dir"]):
-        if cache_file.endswith(".json"):
-            with open(os.path.join(config["cache_dir"], cache_file), "r") as f:
-                cached_data = json.load(f)["result"]
-                flight_graph.add_leg(cached_data["origin"].upper(), cached_data["destination"].upper(),
-                    cached_data["date"], cached_data["price"], cached_data["duration"], cached_data["airline"])
-
-    # Prompt user for origin and destinations
-    origin = input("Enter the origin: ").strip().upper()
-    destinations = {}
-    constraints = {}
-    while True:
-        destination = input(
-            "Enter destination (or type 'done' to finish, or 'const' to enter date constraints): ").strip().upper()
-        if destination.lower() == "done":
-            break
-        if destination.lower() == "const":
-            dest = input("Enter the destination with date constraints: ").strip().upper()
-            sdate = input(f"Enter a start range for bad dates (inclusive) for {dest} (YYYY-MM-DD): ").strip()
-            edate = input(f"Enter an end range for bad dates (inclusive) for {dest} (YYYY-MM-DD): ").strip()
-            if dest in constraints:
-                constraints[dest].append((sdate, edate))
-            else:
-                constraints[dest] = [(sdate, edate)]
-            continue
+    if args.dump_cache:
+        cache_manager.output_cache()
+
+    # Initialize FlightGraph from its snapshot plus any cached journey legs added or removed since
+    flight_graph = FlightGraph.from_cache(cache_manager, config.get("graph_snapshot"))
 
+    if args.queries:
+        # Non-interactive batch: every query shares the graph and its bound tables loaded above
+        defaults = {"alternatives": args.alternatives, "pareto": args.pareto, "deadline": args.deadline,
+                    "routing": args.routing}
+        output = open(args.output, "w") if args.output else sys.stdout
         try:
-            min_days = int(input(f"Enter the minimum number of days to spend in {destination}: ").strip())
-            max_days = int(input(f"Enter the maximum number of days to spend in {destination}: ").strip())
-            if min_days > max_days:
-                print("Minimum days cannot be greater than maximum days. Please try again.")
+            for result in run_batch(flight_graph, load_queries(args.queries), defaults, args.batch_workers):
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+        finally:
+            if output is not sys.stdout:
+                output.close()
+    else:
+        # Prompt user for origin and destinations
+        origin = input("Enter the origin: ").strip().upper()
+        destinations = {}
+        constraints = {}
+        while True:
+            destination = input(
+                "Enter destination (or type 'done' to finish, or 'const' to enter date constraints): ").strip().upper()
+            if destination.lower() == "done":
+                break
+            if destination.lower() == "const":
+                dest = input("Enter the destination with date constraints: ").strip().upper()
+                sdate = input(f"Enter a start range for bad dates (inclusive) for {dest} (YYYY-MM-DD): ").strip()
+                edate = input(f"Enter an end range for bad dates (inclusive) for {dest} (YYYY-MM-DD): ").strip()
+                if dest in constraints:
+                    constraints[dest].append((sdate, edate))
+                else:
+                    constraints[dest] = [(sdate, edate)]
                 continue
-        except ValueError:
-            print("Invalid input. Please enter integers for the number of days.")
-            continue
 
-        destinations[destination] = (min_days, max_days)
-
-    # Find the least-cost path using A* search
-    best_path, best_cost = flight_graph.find_least_cost_path(origin, destinations, constraints)
+            try:
+                min_days = int(input(f"Enter the minimum number of days to spend in {destination}: ").strip())
+                max_days = int(input(f"Enter the maximum number of days to spend in {destination}: ").strip())
+                if min_days > max_days:
+                    print("Minimum days cannot be greater than maximum days. Please try again.")
+                    continue
+            except ValueError:
+                print("Invalid input. Please enter integers for the number of days.")
+                continue
 
-    # Output results
-    print("Round-trip path:")
-    for location, date, cost in best_path:
-        if date:
-            print(f"{location} (Date: {date}, Cost: {cost})")
+            destinations[destination] = (min_days, max_days)
+
+        if args.start_dates:
+            # One search shared by every start date in the range
+            by_start_date = flight_graph.find_by_start_date(origin, destinations, constraints, *args.start_dates,
+                                                            best_only=args.best_start_date)
+            if args.profile:
+                print(flight_graph.search_stats)
+            for start_date, (path, total_cost) in by_start_date.items():
+                if path is None:
+                    print(f"{start_date}: No valid path found.")
+                    continue
+                print(f"{start_date}: Total cost: {total_cost}")
+                for location, date, cost in path:
+                    print(f"  {location} (Date: {date}, Cost: {cost})")
+            if not by_start_date:
+                print("No valid path found.")
+        elif args.pareto or args.alternatives > 1:
+            # Several itineraries from a single search pass
+            itineraries = flight_graph.find_itineraries(origin, destinations, constraints, k=args.alternatives,
+                                                        objective="pareto" if args.pareto else "price")
+            if args.profile:
+                print(flight_graph.search_stats)
+            for number, (path, total_cost, minutes) in enumerate(itineraries, 1):
+                print(f"Option {number}: Total cost: {total_cost}, Flight time: {minutes_to_duration(minutes)}")
+                for location, date, cost in path:
+                    print(f"  {location} (Date: {date}, Cost: {cost})")
+            if not itineraries:
+                print("No valid path found.")
         else:
-            print(location)
-    print(f"Total cost: {best_cost}")
+            # Find the least-cost path using A* search
+            best_path, best_cost = flight_graph.find_least_cost_path(origin, destinations, constraints,
+                                                                     profile=args.profile, workers=args.workers,
+                                                                     deadline=args.deadline, routing=args.routing)
+            if args.profile:
+                print(flight_graph.search_stats)
+                print(flight_graph.search_stats.profile_report())
+
+            # Output results
+            print("Round-trip path:")
+            for location, date, cost in best_path:
+                if date:
+                    print(f"{location} (Date: {date}, Cost: {cost})")
+                else:
+                    print(location)
+            print(f"Total cost: {best_cost}")
+            if flight_graph.search_stats.stopped_early and best_path:
+                print(f"Stopped at the deadline; optimality gap {flight_graph.search_stats.gap:.1%}")